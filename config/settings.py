@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "schedules.middleware.PerformanceBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -118,6 +119,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Rendered schedule fragments and their version counters live here, use a
+# shared backend (e.g. memcached or redis) when running more than one process
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Seconds a rendered month schedule fragment is kept, fragments are also
+# invalidated whenever their assignments, preferences or stats change
+SCHEDULE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Generated schedule PDFs, one file per schedule and content version
+SCHEDULE_PDF_ROOT = os.environ.get(
+    "SCHEDULE_PDF_ROOT", os.path.join(BASE_DIR, "var", "schedule_pdfs")
+)
+# wkhtmltopdf processes run at once per process, and seconds a download waits
+# for its PDF before it is told to retry
+SCHEDULE_PDF_WORKERS = 2
+SCHEDULE_PDF_WAIT_TIMEOUT = 10
+
+# Live updates hold a connection per open schedule page. Under ASGI that is
+# cheap, under WSGI each one holds a worker thread, so there they are only
+# served when this is on, e.g. with the threaded development server.
+SCHEDULE_EVENTS_WSGI = DEBUG
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -158,3 +189,20 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 INTERNAL_IPS = ["127.0.0.1", "::1"]
+
+# Assignment stats retention, applied by the compact_assignment_stats command.
+# Stats snapshots of official schedules older than the latest N are released
+# (None keeps all of them), draft snapshots are released after the given days.
+ASSIGNMENT_STATS_KEEP_OFFICIAL = None
+ASSIGNMENT_STATS_KEEP_DRAFT_DAYS = 90
+
+# Per-request budgets of /schedules/ views, requests over any of them are
+# logged by PerformanceBudgetMiddleware (None disables a budget). The latest
+# samples of each view are kept for the percentiles at /schedules/performance.
+SCHEDULE_PERFORMANCE_BUDGETS = {
+    "queries": 50,
+    "db_ms": 250,
+    "template_ms": 250,
+    "total_ms": 1000,
+}
+SCHEDULE_PERFORMANCE_SAMPLES = 1000
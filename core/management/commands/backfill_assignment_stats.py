@@ -0,0 +1,197 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from schedules.models import AssignmentStats, Schedule
+from schedules.services.stats import (
+    build_assignment_stats,
+    calculate_stats_values,
+    counted_assignments,
+    get_ideal_averages,
+)
+
+
+def month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def next_month_start(day):
+    return month_start(day.year + (day.month // 12), (day.month % 12) + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the assignment stats snapshot of every official schedule "
+        "from assignment history"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of date ranges to rebuild in parallel",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Rebuild schedules that already have stats (default skips them)",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 1:
+            raise CommandError("--workers must be at least 1")
+
+        schedules = list(
+            Schedule.objects.filter(is_official=True).order_by("date", "created_at")
+        )
+        if not schedules:
+            self.stdout.write(self.style.WARNING("No official schedules found"))
+            return
+
+        if options["replace"]:
+            AssignmentStats.objects.unlink_schedules(schedules)
+            skip_ids = set()
+        else:
+            skip_ids = set(
+                AssignmentStats.schedule.through.objects.filter(
+                    schedule__in=schedules
+                ).values_list("schedule_id", flat=True)
+            )
+
+        ideal_averages = get_ideal_averages()
+
+        # Each range only needs the counts from before its first month, so
+        # ranges can be rebuilt independently of each other
+        size = -(-len(schedules) // workers)
+        ranges = [schedules[i : i + size] for i in range(0, len(schedules), size)]
+
+        self.stdout.write(
+            f"Backfilling stats for {len(schedules) - len(skip_ids)} of "
+            f"{len(schedules)} official schedules in {len(ranges)} range(s)"
+        )
+        if len(ranges) == 1:
+            results = [self.backfill_range(ranges[0], ideal_averages, skip_ids)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                results = list(
+                    executor.map(
+                        lambda schedule_range: self.backfill_range_in_thread(
+                            schedule_range, ideal_averages, skip_ids
+                        ),
+                        ranges,
+                    )
+                )
+
+        created = sum(result[0] for result in results)
+        linked = sum(result[1] for result in results)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully backfilled assignment statistics:\n"
+                f"- Created: {created} new stats\n"
+                f"- Linked: {linked} stats to schedules"
+            )
+        )
+
+    def backfill_range_in_thread(self, schedules, ideal_averages, skip_ids):
+        try:
+            return self.backfill_range(schedules, ideal_averages, skip_ids)
+        finally:
+            # Worker threads get their own connection, don't leak it
+            connection.close()
+
+    def backfill_range(self, schedules, ideal_averages, skip_ids):
+        """
+        Walk the assignments of a contiguous range of schedules once in date
+        order, snapshotting the cumulative counts at the end of each month.
+        A pair whose values did not change since the previous snapshot reuses
+        that snapshot's stats row.
+        """
+        first_day = month_start(schedules[0].date.year, schedules[0].date.month)
+        last_day = next_month_start(schedules[-1].date)
+
+        # Counts from before this range in a single aggregate query
+        user_counts = Counter()
+        task_counts = Counter()
+        for row in (
+            counted_assignments()
+            .filter(assigned_at__lt=first_day)
+            .values("user_id", "task_id")
+            .annotate(count=Count("id"))
+        ):
+            user_counts[(row["user_id"], row["task_id"])] += row["count"]
+            task_counts[row["task_id"]] += row["count"]
+
+        assignments = (
+            counted_assignments()
+            .filter(assigned_at__gte=first_day, assigned_at__lt=last_day)
+            .order_by("assigned_at")
+            .values_list("user_id", "task_id", "assigned_at")
+            .iterator(chunk_size=2000)
+        )
+        pending = next(assignments, None)
+
+        new_stats = []
+        links = []
+        snapshot_times = {}
+        previous = {}
+        for schedule in schedules:
+            boundary = next_month_start(schedule.date)
+            while pending is not None and pending[2] < boundary:
+                user_counts[(pending[0], pending[1])] += 1
+                task_counts[pending[1]] += 1
+                pending = next(assignments, None)
+
+            if schedule.id in skip_ids:
+                # Counts still advance, but later snapshots can't reuse rows
+                # that this run did not write
+                previous = {}
+                continue
+
+            # Like generate_assignment_stats, only eligible pairs get stats,
+            # though every assignment counts towards its task's total
+            current = {}
+            for pair, ideal_average in ideal_averages.items():
+                values = calculate_stats_values(
+                    ideal_average, user_counts[pair], task_counts[pair[1]]
+                )
+                stat = previous.get(pair)
+                if stat is None or stat[0] != values:
+                    stat = (values, build_assignment_stats(*pair, values))
+                    new_stats.append(stat[1])
+                    snapshot_times[id(stat[1])] = boundary - timedelta(microseconds=1)
+                current[pair] = stat
+                links.append((stat[1], schedule.id))
+            previous = current
+
+        with transaction.atomic():
+            AssignmentStats.objects.bulk_create(new_stats, batch_size=1000)
+
+            # created_at is auto_now_add, backdate it to the end of the
+            # schedule's month so the latest-stats lookups order snapshots by
+            # month, whenever the schedules were created
+            stats_by_time = {}
+            for stat in new_stats:
+                stats_by_time.setdefault(snapshot_times[id(stat)], []).append(stat.pk)
+            for created_at, pks in stats_by_time.items():
+                AssignmentStats.objects.filter(pk__in=pks).update(created_at=created_at)
+
+            Through = AssignmentStats.schedule.through
+            Through.objects.bulk_create(
+                [
+                    Through(assignmentstats_id=stat.pk, schedule_id=schedule_id)
+                    for stat, schedule_id in links
+                ],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+
+        self.stdout.write(
+            f"{schedules[0].date:%B %Y} - {schedules[-1].date:%B %Y}: "
+            f"{len(new_stats)} created, {len(links)} linked"
+        )
+        return len(new_stats), len(links)
@@ -2,8 +2,8 @@ from datetime import datetime, timezone
 from django.core.management.base import BaseCommand
 from pathlib import Path
 import json
-import calendar
 from schedules.models import Schedule, Service, Task, Assignment
+from schedules.utils import get_month_calendar
 from users.models import User
 
 
@@ -16,11 +16,6 @@ class WeekIndexError(Exception):
 class Command(BaseCommand):
     help = "Seeds assignments into the database from JSON"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Set Sunday as the first day of the week
-        calendar.setfirstweekday(calendar.SUNDAY)
-
     def add_arguments(self, parser):
         parser.add_argument(
             "--json-path",
@@ -96,7 +91,7 @@ class Command(BaseCommand):
                     day = int(date_parts[2])
 
                     # Check if the day appears in any service day in the month's calendar
-                    month_calendar = calendar.monthcalendar(year, month)
+                    month_calendar, _ = get_month_calendar(year, month)
                     valid_service_day = False
 
                     for week in month_calendar:
@@ -137,9 +132,12 @@ class Command(BaseCommand):
                         date__month=month,
                     )
 
-                    # Create the assignment if it doesn't exist
+                    # Create the assignment if its cell is empty
                     assignment, created = Assignment.objects.get_or_create(
-                        user=user, task=task, assigned_at=assigned_at, schedule=schedule
+                        task=task,
+                        assigned_at=assigned_at,
+                        schedule=schedule,
+                        defaults={"user": user},
                     )
 
                     if created:
@@ -12,11 +12,6 @@ from users.models import User
 class Command(BaseCommand):
     help = "Seeds schedules into the database"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Set Sunday as the first day of the week
-        calendar.setfirstweekday(calendar.SUNDAY)
-
     def handle(self, *args, **options):
         self.stdout.write("Updating Schedules")
         base_path = (Path(__file__).resolve().parent.parent.parent) / "fixtures"
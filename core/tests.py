@@ -1,3 +1,133 @@
-from django.test import TestCase
+import datetime
+from datetime import time
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.utils import timezone
+from io import StringIO
+from schedules.models import (
+    Assignment,
+    AssignmentStats,
+    Schedule,
+    Service,
+    Task,
+    TaskPreference,
+)
+from users.models import User
 
-# Create your tests here.
+
+class BackfillAssignmentStatsTestCase(TransactionTestCase):
+    # Worker threads use their own connections, so rows must be committed
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email="user1@example.com", first_name="User", last_name="One"
+        )
+        self.user2 = User.objects.create_user(
+            email="user2@example.com", first_name="User", last_name="Two"
+        )
+        service = Service.objects.create(
+            name="Test Service", day_of_week=0, start_time=time(9, 0)
+        )
+        self.task = Task.objects.create(
+            name="Test Task", id="test_task_id", service=service
+        )
+        TaskPreference.objects.create(user=self.user1, task=self.task, value=1.0)
+        TaskPreference.objects.create(user=self.user2, task=self.task, value=1.0)
+
+        self.may = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user1
+        )
+        self.june = Schedule.objects.create(
+            name="June 2023", date=datetime.date(2023, 6, 1), user=self.user1
+        )
+        Schedule.objects.update(is_official=True)
+
+        for user, day, schedule in [
+            (self.user1, datetime.date(2023, 5, 7), self.may),
+            (self.user1, datetime.date(2023, 5, 14), self.may),
+            (self.user2, datetime.date(2023, 5, 21), self.may),
+            (self.user2, datetime.date(2023, 6, 4), self.june),
+        ]:
+            Assignment.objects.create(
+                user=user,
+                task=self.task,
+                schedule=schedule,
+                assigned_at=timezone.make_aware(datetime.datetime.combine(day, time())),
+            )
+
+    def snapshot(self, schedule):
+        return {
+            stat.user_id: stat.actual_average
+            for stat in AssignmentStats.objects.filter(schedule=schedule)
+        }
+
+    def assert_snapshots(self):
+        self.assertEqual(
+            self.snapshot(self.may),
+            {
+                self.user1.id: Decimal("0.66666667"),
+                self.user2.id: Decimal("0.33333333"),
+            },
+        )
+        self.assertEqual(
+            self.snapshot(self.june),
+            {self.user1.id: Decimal("0.5"), self.user2.id: Decimal("0.5")},
+        )
+
+    def test_backfill(self):
+        call_command("backfill_assignment_stats", stdout=StringIO())
+        self.assert_snapshots()
+        stat = AssignmentStats.objects.get(schedule=self.june, user=self.user1)
+        self.assertEqual(stat.assignment_delta, Decimal("0"))
+        self.assertEqual(stat.ideal_average_float, 0.5)
+
+    def test_backfill_only_eligible_pairs(self):
+        user3 = User.objects.create_user(
+            email="user3@example.com", first_name="User", last_name="Three"
+        )
+        Assignment.objects.create(
+            user=user3,
+            task=self.task,
+            schedule=self.june,
+            assigned_at=timezone.make_aware(datetime.datetime(2023, 6, 11)),
+        )
+
+        call_command("backfill_assignment_stats", stdout=StringIO())
+
+        self.assertFalse(AssignmentStats.objects.filter(user=user3).exists())
+        self.assertEqual(
+            self.snapshot(self.june),
+            {
+                self.user1.id: Decimal("0.4"),
+                self.user2.id: Decimal("0.4"),
+            },
+        )
+
+    def test_backfill_orders_snapshots_by_month(self):
+        # June's schedule was created before May's
+        Schedule.objects.filter(id=self.june.id).update(
+            created_at=self.may.created_at - datetime.timedelta(days=1)
+        )
+
+        call_command("backfill_assignment_stats", stdout=StringIO())
+
+        self.assertEqual(
+            {
+                stat.user_id: stat.actual_average
+                for stat in AssignmentStats.objects.latest_official(tasks=[self.task])
+            },
+            self.snapshot(self.june),
+        )
+
+    def test_backfill_in_parallel(self):
+        call_command("backfill_assignment_stats", workers=2, stdout=StringIO())
+        self.assert_snapshots()
+
+    def test_backfill_skips_existing_unless_replaced(self):
+        call_command("backfill_assignment_stats", stdout=StringIO())
+        call_command("backfill_assignment_stats", stdout=StringIO())
+        self.assertEqual(AssignmentStats.objects.count(), 4)
+
+        call_command("backfill_assignment_stats", replace=True, stdout=StringIO())
+        self.assertEqual(AssignmentStats.objects.count(), 4)
+        self.assert_snapshots()
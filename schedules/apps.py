@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SchedulesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "schedules"
+
+    def ready(self):
+        from schedules import signals  # noqa: F401
+        from schedules.metrics import instrument_templates
+
+        instrument_templates()
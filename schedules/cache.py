@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+ELIGIBILITY_VERSION_KEY = "schedules:eligibility-version"
+SERVICES_VERSION_KEY = "schedules:services-version"
+USER_NAME_INDEX_KEY = "schedules:user-name-index"
+
+
+def _get_version(key) -> int:
+    cache.add(key, 1, timeout=None)
+    return cache.get(key, 1)
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def get_eligibility_version() -> int:
+    """
+    Version of the task preferences, assignment stats and users, which decide
+    who is eligible for a task, in which order they are suggested and the
+    names shown for them
+    """
+    return _get_version(ELIGIBILITY_VERSION_KEY)
+
+
+def bump_eligibility_version():
+    """Invalidate the cached grids, eligible users and PDFs of all schedules"""
+    _bump_version(ELIGIBILITY_VERSION_KEY)
+
+
+def get_services_version() -> int:
+    """
+    Version of the services and tasks, which lay out the grid of every
+    schedule
+    """
+    return _get_version(SERVICES_VERSION_KEY)
+
+
+def bump_services_version():
+    """Invalidate the cached grids and PDFs of all schedules"""
+    _bump_version(SERVICES_VERSION_KEY)
+
+
+def get_user_name_index() -> dict[str, int]:
+    """
+    Map of inverted user name ("Last, First") to user id, the fallback for
+    assignment maps that name users instead of giving their ids
+    """
+    index = cache.get(USER_NAME_INDEX_KEY)
+    if index is None:
+        index = {
+            f"{last_name}, {first_name}": user_id
+            for user_id, last_name, first_name in get_user_model()
+            .objects.order_by("id")
+            .values_list("id", "last_name", "first_name")
+        }
+        cache.set(USER_NAME_INDEX_KEY, index, timeout=None)
+    return index
+
+
+def invalidate_user_name_index():
+    """Rebuild the name index on next use, after users are saved or deleted"""
+    cache.delete(USER_NAME_INDEX_KEY)
+
+
+def resolve_user_id(value) -> int | None:
+    """
+    User id of an assignment map value, which is either a user id or, from
+    older clients, an inverted user name
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        return get_user_name_index().get(value)
+    return None
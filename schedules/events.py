@@ -0,0 +1,100 @@
+import asyncio
+import queue
+import threading
+from django.contrib.auth import get_user_model
+
+# Messages a slow subscriber may fall behind by before it is dropped, it
+# catches up through the changes endpoint when it reconnects
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ScheduleBroadcaster:
+    """
+    In-process pub/sub of schedule changes. Publishers are the sync views
+    that save changes. Subscribers are event streams, async ones under ASGI
+    whose messages are handed to their event loop, or sync ones under WSGI
+    that block on a thread-safe queue.
+
+    Only reaches subscribers connected to this process, run a single
+    process or replace it with a shared broker when scaling out.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, schedule_id) -> asyncio.Queue:
+        """Subscribe from a coroutine, messages arrive on the returned queue"""
+        messages = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        self._add(
+            schedule_id,
+            messages,
+            lambda message: loop.call_soon_threadsafe(self._deliver, messages, message),
+        )
+        return messages
+
+    def subscribe_sync(self, schedule_id) -> queue.Queue:
+        """Subscribe from a thread, messages arrive on the returned queue"""
+        messages = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._add(
+            schedule_id, messages, lambda message: self._deliver(messages, message)
+        )
+        return messages
+
+    def _add(self, schedule_id, messages, deliver):
+        with self._lock:
+            self._subscribers.setdefault(schedule_id, {})[messages] = deliver
+
+    def unsubscribe(self, schedule_id, messages):
+        with self._lock:
+            subscribers = self._subscribers.get(schedule_id, {})
+            subscribers.pop(messages, None)
+            if not subscribers:
+                self._subscribers.pop(schedule_id, None)
+
+    def has_subscribers(self, schedule_id) -> bool:
+        with self._lock:
+            return bool(self._subscribers.get(schedule_id))
+
+    def publish(self, schedule_id, message):
+        """Publish from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(schedule_id, {}).items())
+        for messages, deliver in subscribers:
+            try:
+                deliver(message)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(schedule_id, messages)
+
+    @staticmethod
+    def _deliver(messages, message):
+        try:
+            messages.put_nowait(message)
+        except (asyncio.QueueFull, queue.Full):
+            # Tell the stream to end, the client reconnects and catches up
+            try:
+                messages.get_nowait()
+                messages.put_nowait(None)
+            except (asyncio.QueueEmpty, queue.Empty, asyncio.QueueFull, queue.Full):
+                # Raced with the subscriber or another publisher
+                pass
+
+
+broadcaster = ScheduleBroadcaster()
+
+
+def publish_changes(schedule_id, version: int, changes: dict[str, int | None]):
+    """Send changed cells, as recorded in the change log, to a schedule's subscribers"""
+    if not broadcaster.has_subscribers(schedule_id):
+        return
+    users = {
+        user.pk: user.inverted_name()
+        for user in get_user_model().objects.filter(
+            id__in={user_id for user_id in changes.values() if user_id}
+        )
+    }
+    broadcaster.publish(
+        schedule_id, {"version": version, "changes": changes, "users": users}
+    )
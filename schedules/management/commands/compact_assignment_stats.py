@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from schedules.models import AssignmentStats, Schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Release assignment stats snapshots past the retention policy and "
+        "delete stats rows no schedule references anymore"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-official",
+            type=int,
+            default=settings.ASSIGNMENT_STATS_KEEP_OFFICIAL,
+            help="Keep stats for only the latest N official schedules (default: all)",
+        )
+        parser.add_argument(
+            "--keep-draft-days",
+            type=int,
+            default=settings.ASSIGNMENT_STATS_KEEP_DRAFT_DAYS,
+            help="Keep stats for draft schedules updated within this many days",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be removed without removing anything",
+        )
+
+    def handle(self, *args, **options):
+        keep_official = options["keep_official"]
+        keep_draft_days = options["keep_draft_days"]
+
+        # The latest official snapshot seeds the next schedule's stats
+        if keep_official is not None and keep_official < 1:
+            raise CommandError("--keep-official must be at least 1")
+
+        expired = Q(
+            is_official=False,
+            updated_at__lt=timezone.now() - timedelta(days=keep_draft_days),
+        )
+        if keep_official is not None:
+            kept_official = Schedule.objects.filter(is_official=True).order_by(
+                "-date", "-created_at"
+            )[:keep_official]
+            expired |= Q(is_official=True) & ~Q(id__in=kept_official)
+
+        expired_schedules = Schedule.objects.filter(
+            expired, assignment_stats__isnull=False
+        ).distinct()
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Would release stats of {expired_schedules.count()} schedules, "
+                f"{AssignmentStats.objects.orphaned().count()} stats are already orphaned"
+            )
+            return
+
+        with transaction.atomic():
+            released = len(expired_schedules)
+            unlinked = AssignmentStats.objects.unlink_schedules(expired_schedules)
+            orphans = AssignmentStats.objects.delete_orphans()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compacted assignment statistics:\n"
+                f"- Released: stats of {released} schedules\n"
+                f"- Deleted: {unlinked + orphans} unreferenced stats"
+            )
+        )
@@ -0,0 +1,45 @@
+from datetime import date
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from schedules.services.exporter import EXPORT_DATASETS, get_export_rows, write_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Export assignments, assignment stats and task preferences as one CSV "
+        "file per dataset, streamed from the database for offline analysis"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", type=str, help="Directory to write <dataset>.csv files to"
+        )
+        parser.add_argument(
+            "--dataset",
+            action="append",
+            choices=list(EXPORT_DATASETS),
+            help="Dataset to export, may be repeated (default: all)",
+        )
+        parser.add_argument(
+            "--start", type=date.fromisoformat, help="First day, YYYY-MM-DD"
+        )
+        parser.add_argument(
+            "--end", type=date.fromisoformat, help="Last day, YYYY-MM-DD"
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"]
+        end = options["end"]
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end")
+
+        output = Path(options["output"])
+        output.mkdir(parents=True, exist_ok=True)
+
+        for dataset in options["dataset"] or EXPORT_DATASETS:
+            path = output / f"{dataset}.csv"
+            with open(path, "w", newline="") as f:
+                count = write_csv(get_export_rows(dataset, start, end), f)
+            self.stdout.write(
+                self.style.SUCCESS(f"Exported {count} {dataset} to {path}")
+            )
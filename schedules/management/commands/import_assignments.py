@@ -0,0 +1,63 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from schedules.models import Schedule
+from schedules.services.importer import (
+    IMPORT_FORMATS,
+    import_assignments,
+    parse_assignments,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a month's assignments into a schedule from a CSV grid or a JSON "
+        "assignment map, writing all valid rows in one transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("schedule", type=int, help="ID of the schedule")
+        parser.add_argument("path", type=str, help="Path to the CSV or JSON file")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Format of the file (default: from its extension)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report rejected rows without importing anything",
+        )
+
+    def handle(self, *args, **options):
+        schedule = Schedule.objects.filter(id=options["schedule"]).first()
+        if not schedule:
+            raise CommandError(f"Schedule {options['schedule']} not found")
+
+        path = Path(options["path"])
+        format = options["format"] or path.suffix.lstrip(".").lower()
+        if format not in IMPORT_FORMATS:
+            raise CommandError(f"Use --format, one of {', '.join(IMPORT_FORMATS)}")
+
+        try:
+            rows = parse_assignments(
+                schedule, path.read_text(encoding="utf-8-sig"), format
+            )
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        report = import_assignments(schedule, rows, dry_run=options["dry_run"])
+
+        for rejected in report["rejected"]:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"{rejected['row']}: {rejected['key']} {rejected['value']!r} "
+                    f"({rejected['error']})"
+                )
+            )
+        verb = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report['imported']} of {len(rows)} cells into {schedule}, "
+                f"rejected {len(report['rejected'])}"
+            )
+        )
@@ -0,0 +1,187 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Exists, Max, Min, OuterRef, StdDev
+from django.db.models.functions import Abs
+from schedules.models import AssignmentStats, Schedule, TaskPreference
+from schedules.services.stats import counted_assignments, get_ideal_averages
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a report on the assignment stats snapshot of an official "
+        "schedule, the stats the solver reads when scheduling the next month"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--schedule",
+            type=int,
+            help="ID of the official schedule to report on (default: latest)",
+        )
+        parser.add_argument(
+            "--outlier-threshold",
+            type=float,
+            default=0.5,
+            help="Report users whose assignment delta is at least this far from 0",
+        )
+
+    def handle(self, *args, **options):
+        schedule_id = options.get("schedule")
+        threshold = options["outlier_threshold"]
+
+        if schedule_id:
+            schedule = Schedule.objects.filter(id=schedule_id).first()
+        else:
+            schedule = Schedule.objects.get_latest_selected()
+
+        if not schedule:
+            self.stdout.write(self.style.ERROR("No schedule found"))
+            return
+        if not schedule.is_official:
+            self.stdout.write(
+                self.style.WARNING(f"{schedule} is not official, the solver ignores it")
+            )
+
+        self.timings = []
+        stats = AssignmentStats.objects.filter(schedule=schedule)
+
+        distribution = self.timed(
+            "Delta distribution",
+            lambda: list(
+                stats.values("task_id", "task__name")
+                .annotate(
+                    count=Count("id"),
+                    min=Min("assignment_delta_float"),
+                    max=Max("assignment_delta_float"),
+                    mean=Avg("assignment_delta_float"),
+                    stddev=StdDev("assignment_delta_float"),
+                )
+                .order_by("task__order", "task_id")
+            ),
+        )
+
+        outliers = self.timed(
+            "Outliers",
+            lambda: list(
+                stats.annotate(distance=Abs("assignment_delta_float"))
+                .filter(distance__gte=threshold)
+                .order_by("-distance")
+                .values_list(
+                    "user__last_name",
+                    "user__first_name",
+                    "task_id",
+                    "assignment_delta_float",
+                )
+            ),
+        )
+
+        # Eligible pairs without a stat in this snapshot are the KeyError
+        # paths in Scheduler#get_actual_average and #get_ideal_average
+        missing = self.timed(
+            "Missing stats",
+            lambda: list(
+                TaskPreference.objects.filter(value__gt=0, user__is_active=True)
+                .annotate(
+                    has_stat=Exists(
+                        stats.filter(
+                            user_id=OuterRef("user_id"), task_id=OuterRef("task_id")
+                        )
+                    ),
+                    user_has_stats=Exists(stats.filter(user_id=OuterRef("user_id"))),
+                )
+                .filter(has_stat=False)
+                .order_by("user__last_name", "user__first_name", "task_id")
+                .values_list(
+                    "user__last_name", "user__first_name", "task_id", "user_has_stats"
+                )
+            ),
+        )
+
+        # Cost of the queries a full stats computation is made of
+        self.timed("Ideal averages", get_ideal_averages)
+        self.timed(
+            "Actual counts",
+            lambda: list(
+                counted_assignments()
+                .values("user_id", "task_id")
+                .annotate(count=Count("id"))
+            ),
+        )
+
+        self.stdout.write("\n")
+        self.stdout.write(self.style.SUCCESS("=" * 80))
+        self.stdout.write(self.style.SUCCESS(f"Assignment Stats Report: {schedule}"))
+        self.stdout.write(self.style.SUCCESS("=" * 80))
+
+        self.write_distribution(distribution)
+        self.write_outliers(outliers, threshold)
+        self.write_missing(missing)
+        self.write_timings()
+
+        self.stdout.write(self.style.SUCCESS("=" * 80))
+        self.stdout.write("\n")
+
+    def timed(self, stage, func):
+        start = time.perf_counter()
+        result = func()
+        self.timings.append((stage, time.perf_counter() - start))
+        return result
+
+    def write_distribution(self, distribution):
+        self.stdout.write("\n")
+        self.stdout.write(self.style.HTTP_INFO("Assignment delta by task"))
+        if not distribution:
+            self.stdout.write(self.style.WARNING("No stats in this snapshot"))
+            return
+
+        task_col_width = max(
+            len("Task"), max(len(row["task_id"]) for row in distribution)
+        )
+        header = f"{'Task':<{task_col_width}} | {'Users':>5}"
+        for column in ("Min", "Max", "Mean", "StdDev"):
+            header += f" | {column:>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        for row in distribution:
+            line = f"{row['task_id']:<{task_col_width}} | {row['count']:>5}"
+            for column in ("min", "max", "mean", "stddev"):
+                value = row[column]
+                line += f" | {value:>8.3f}" if value is not None else f" | {'-':>8}"
+            self.stdout.write(line)
+
+    def write_outliers(self, outliers, threshold):
+        self.stdout.write("\n")
+        self.stdout.write(
+            self.style.HTTP_INFO(f"Outliers (|assignment delta| >= {threshold})")
+        )
+        if not outliers:
+            self.stdout.write(self.style.SUCCESS("None"))
+            return
+
+        for last_name, first_name, task_id, delta in outliers:
+            self.stdout.write(
+                self.style.WARNING(f"{last_name}, {first_name}: {task_id} {delta:+.3f}")
+            )
+
+    def write_missing(self, missing):
+        self.stdout.write("\n")
+        self.stdout.write(self.style.HTTP_INFO("Eligible users missing stats"))
+        if not missing:
+            self.stdout.write(self.style.SUCCESS("None"))
+            return
+
+        for last_name, first_name, task_id, user_has_stats in missing:
+            # Users with no stats at all are scheduled as if their averages
+            # were 0, a missing task stat fails the solver
+            reason = "missing task stat" if user_has_stats else "no stats at all"
+            self.stdout.write(
+                self.style.ERROR(f"{last_name}, {first_name}: {task_id} ({reason})")
+            )
+        self.stdout.write(f"Total: {len(missing)}")
+
+    def write_timings(self):
+        self.stdout.write("\n")
+        self.stdout.write(self.style.HTTP_INFO("Timings"))
+        for stage, seconds in self.timings:
+            self.stdout.write(f"{stage:<20} {seconds * 1000:>8.1f} ms")
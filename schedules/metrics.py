@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from django.conf import settings
+from django.template.base import Template
+
+METRICS = ("queries", "db_ms", "template_ms", "total_ms")
+PERCENTILES = (50, 90, 99)
+
+_current: ContextVar["RequestMetrics | None"] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+class RequestMetrics:
+    """Query count, database time and template render time of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper, see connection.execute_wrapper"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def measure(self):
+        """Collect the metrics of the templates rendered while active"""
+        return _current.set(self)
+
+    def stop(self, token):
+        _current.reset(token)
+
+
+# Template.render before instrument_templates
+_template_render = None
+
+
+def _timed_template_render(self, context):
+    metrics = _current.get()
+    if metrics is None:
+        return _template_render(self, context)
+
+    # Included templates render inside their parent, only the outermost
+    # template is timed
+    metrics._template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context)
+    finally:
+        metrics._template_depth -= 1
+        if not metrics._template_depth:
+            metrics.template_time += time.perf_counter() - start
+
+
+def instrument_templates():
+    """
+    Time template rendering for requests being measured, see
+    RequestMetrics.measure. Renders outside a measured request only pay for
+    a context variable lookup. Installed by SchedulesConfig.ready(), calling
+    it again does nothing.
+    """
+    global _template_render
+    if Template.render is _timed_template_render:
+        return
+    _template_render = Template.render
+    Template.render = _timed_template_render
+
+
+class MetricsStore:
+    """
+    Latest samples of each view's metrics, kept in memory by the process
+    that served them
+    """
+
+    def __init__(self):
+        self._samples = defaultdict(self._new_samples)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_samples():
+        return deque(maxlen=settings.SCHEDULE_PERFORMANCE_SAMPLES)
+
+    def record(self, view_name, sample: dict):
+        with self._lock:
+            self._samples[view_name].append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def get_percentiles(self) -> dict[str, dict]:
+        """
+        Map of view name to its sample count and, per metric, percentiles
+            {"count": n, "queries": {"p50": .., "p90": .., "p99": .., "max": ..}, ...}
+        """
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+
+        percentiles = {}
+        for view_name, view_samples in sorted(samples.items()):
+            percentiles[view_name] = {"count": len(view_samples)}
+            for metric in METRICS:
+                values = sorted(sample[metric] for sample in view_samples)
+                percentiles[view_name][metric] = {
+                    **{f"p{p}": get_percentile(values, p) for p in PERCENTILES},
+                    "max": values[-1],
+                }
+        return percentiles
+
+
+def get_percentile(sorted_values: list, percentile) -> float:
+    """Nearest-rank percentile of sorted values"""
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def get_budget_violations(sample: dict) -> list[str]:
+    """Descriptions of the metrics of a sample that are over budget"""
+    return [
+        f"{metric} {sample[metric]:g} > {budget:g}"
+        for metric, budget in settings.SCHEDULE_PERFORMANCE_BUDGETS.items()
+        if budget is not None and sample[metric] > budget
+    ]
+
+
+metrics_store = MetricsStore()
@@ -1,6 +1,16 @@
+import logging
+import time
+from django.db import connection
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.conf import settings
+from schedules.metrics import (
+    RequestMetrics,
+    get_budget_violations,
+    metrics_store,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class LoginRequiredMiddleware:
@@ -19,3 +29,59 @@ class LoginRequiredMiddleware:
                 return redirect(f"{settings.LOGIN_URL}?next={request.path}")
 
         return self.get_response(request)
+
+
+class PerformanceBudgetMiddleware:
+    """
+    Record the query count, database time, template render time and latency
+    of /schedules/ requests, log the ones over SCHEDULE_PERFORMANCE_BUDGETS
+    and keep samples for the percentiles of schedules:performance.
+
+    Streaming responses are measured until the view returns them, what is
+    done while their content is streamed is not counted. Neither are the
+    queries of async views, which run in other threads.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith("/schedules/"):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = metrics.measure()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        total_time = time.perf_counter() - start
+
+        sample = {
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_time * 1000, 1),
+            "template_ms": round(metrics.template_time * 1000, 1),
+            "total_ms": round(total_time * 1000, 1),
+        }
+        response["Server-Timing"] = (
+            f"db;dur={sample['db_ms']}, template;dur={sample['template_ms']}, "
+            f"total;dur={sample['total_ms']}"
+        )
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        metrics_store.record(match.view_name, sample)
+
+        violations = get_budget_violations(sample)
+        if violations:
+            logger.warning(
+                "%s %s (%s) over budget: %s",
+                request.method,
+                request.path,
+                match.view_name,
+                ", ".join(violations),
+            )
+        return response
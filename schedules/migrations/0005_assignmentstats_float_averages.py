@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def copy_decimal_averages(apps, schema_editor):
+    AssignmentStats = apps.get_model("schedules", "AssignmentStats")
+    AssignmentStats.objects.update(
+        ideal_average_float=Cast("ideal_average", models.FloatField()),
+        actual_average_float=Cast("actual_average", models.FloatField()),
+        assignment_delta_float=Cast("assignment_delta", models.FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedules", "0004_auto_20250615_2247"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignmentstats",
+            name="actual_average_float",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="assignmentstats",
+            name="assignment_delta_float",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="assignmentstats",
+            name="ideal_average_float",
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(copy_decimal_averages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedules", "0005_assignmentstats_float_averages"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="assignmentstats",
+            name="schedules_a_user_id_3351a8_idx",
+        ),
+        migrations.AddIndex(
+            model_name="assignmentstats",
+            index=models.Index(
+                fields=["user", "task", "-created_at"],
+                name="assignment_stats_latest_idx",
+            ),
+        ),
+    ]
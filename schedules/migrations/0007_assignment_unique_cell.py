@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def delete_duplicate_assignments(apps, schema_editor):
+    """Keep the latest assignment of each cell, concurrent saves could add more"""
+    Assignment = apps.get_model("schedules", "Assignment")
+    Assignment.objects.filter(
+        Exists(
+            Assignment.objects.filter(
+                schedule=OuterRef("schedule"),
+                task=OuterRef("task"),
+                assigned_at=OuterRef("assigned_at"),
+                id__gt=OuterRef("id"),
+            )
+        )
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedules", "0006_assignmentstats_latest_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_assignments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="assignment",
+            constraint=models.UniqueConstraint(
+                fields=("schedule", "task", "assigned_at"),
+                name="unique_assignment_per_cell",
+            ),
+        ),
+    ]
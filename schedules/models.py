@@ -1,9 +1,14 @@
+import hashlib
 from datetime import date, timedelta
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import RowNumber
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from schedules.cache import bump_eligibility_version
+from schedules.events import publish_changes
 from schedules.decorators import round_decimal
 
 
@@ -31,6 +36,35 @@ class ScheduleManager(models.Manager):
 
         return schedule
 
+    def lock_version(self, schedule_id) -> int:
+        """Lock a schedule's row for an edit and return its current version"""
+        return (
+            self.select_for_update()
+            .values_list("version", flat=True)
+            .get(pk=schedule_id)
+        )
+
+    def get_version(self, schedule_id) -> str | None:
+        """
+        Version of a schedule's contents for HTTP validators and cached
+        fragments. Changes when the schedule is saved or its assignments are
+        edited, and when assignments are added or removed some other way.
+        """
+        version = (
+            self.filter(id=schedule_id)
+            .annotate(
+                assignment_count=Count("assignments"),
+                last_assignment_id=Max("assignments__id"),
+            )
+            .values_list(
+                "version", "updated_at", "assignment_count", "last_assignment_id"
+            )
+            .first()
+        )
+        if version is None:
+            return None
+        return hashlib.md5(f"{schedule_id}:{version}".encode()).hexdigest()
+
 
 class Schedule(models.Model):
     """
@@ -50,6 +84,9 @@ class Schedule(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    # Incremented by every edit of the assignments, see AssignmentChange
+    version = models.PositiveIntegerField(default=0)
+
     # The base schedule this one builds upon (like a parent commit)
     base_schedule = models.ForeignKey(
         "self",
@@ -96,6 +133,11 @@ class Schedule(models.Model):
         self.is_official = True
         self.save()  # This will trigger generate_assignment_stats if needed
 
+        # Members download the official schedule, have its PDF ready
+        from schedules.services.pdf import pregenerate_schedule_pdf
+
+        pregenerate_schedule_pdf(self)
+
     def generate_assignment_stats(self):
         """Generate assignment stats for this schedule.
         For user/task combinations with assignments in this schedule, create new stats.
@@ -141,14 +183,9 @@ class Schedule(models.Model):
         # Get all existing stats for relevant user/task combinations in a single query
         latest_stats = {
             (stat.user_id, stat.task_id): stat
-            for stat in AssignmentStats.objects.filter(
-                user__in=relevant_users,
-                task__in=relevant_tasks,
-                # Only consider stats that are associated with official schedules
-                schedule__is_official=True,
+            for stat in AssignmentStats.objects.latest_official(
+                users=relevant_users, tasks=relevant_tasks
             )
-            .order_by("user_id", "task_id", "-created_at")
-            .distinct("user_id", "task_id")
         }
         print(f"Found {len(latest_stats)} existing stats to potentially reuse")
 
@@ -181,6 +218,9 @@ class Schedule(models.Model):
                             ideal_average=0,  # Will be calculated on save
                             actual_average=0,  # Will be calculated on save
                             assignment_delta=0,  # Will be calculated on save
+                            ideal_average_float=0,
+                            actual_average_float=0,
+                            assignment_delta_float=0,
                         )
                     )
                     created_from_assignments += 1
@@ -200,6 +240,9 @@ class Schedule(models.Model):
                                     ideal_average=0,  # Will be calculated on save
                                     actual_average=0,  # Will be calculated on save
                                     assignment_delta=0,  # Will be calculated on save
+                                    ideal_average_float=0,
+                                    actual_average_float=0,
+                                    assignment_delta_float=0,
                                 )
                             )
                             created_from_no_existing += 1
@@ -225,25 +268,59 @@ class Schedule(models.Model):
                     stat.schedule.add(self)
             print(f"Updated {len(stats_to_update)} existing stats")
 
+        bump_eligibility_version()
+
     def _cleanup_old_stats(self):
-        """Clean up old assignment stats to prevent database bloat"""
-        self.assignment_stats.all().delete()
+        """
+        Detach this schedule from its assignment stats. Stats are shared with
+        other schedules through the M2M, so only rows that no other schedule
+        references anymore are deleted.
+        """
+        AssignmentStats.objects.unlink_schedules([self])
 
     def force_recalculate_stats(self):
         """Force recalculation of assignment stats for this schedule"""
-        self._cleanup_old_stats()
+        # generate_assignment_stats cleans up the old stats first
         self.generate_assignment_stats()
 
     def save(self, *args, **kwargs):
-        """Update statistics before saving"""
+        """Update statistics after saving"""
         self.updated_at = timezone.now()
 
-        # If this is becoming official and has no stats yet, generate them
-        if self.is_official and self.assignment_stats.count() == 0:
-            self.generate_assignment_stats()
+        # If this is becoming official and has no stats yet, generate them.
+        # Stats are linked through the M2M, so the schedule needs an id first
+        needs_stats = self.is_official and (
+            self.pk is None or not self.assignment_stats.exists()
+        )
 
         super().save(*args, **kwargs)
 
+        if needs_stats:
+            self.generate_assignment_stats()
+
+    def record_changes(self, version: int, changes: dict[str, int | None]) -> int:
+        """
+        Log changed cells under the version after the given one, a map of
+        assignment key to user id, None for a cleared cell. Must run in the
+        transaction that changed them, with this schedule's row locked.
+        """
+        self.version = version + 1
+        self.updated_at = timezone.now()
+        Schedule.objects.filter(pk=self.pk).update(
+            version=self.version, updated_at=self.updated_at
+        )
+        AssignmentChange.objects.bulk_create(
+            [
+                AssignmentChange(
+                    schedule=self, version=self.version, key=key, user_id=user_id
+                )
+                for key, user_id in changes.items()
+            ]
+        )
+        version = self.version
+        transaction.on_commit(lambda: publish_changes(self.pk, version, changes))
+        return version
+
     # TODO this might make more sense then creating all assignments
     # and passing the schedule in, but we'll see. should definitely bulk insert if we can
     def create_assignment(self, user, task, assigned_at=None):
@@ -343,6 +420,7 @@ class Task(models.Model):
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
         self.excludes.add(self)
+        bump_eligibility_version()
 
     def is_excluded(self, task):
         return self.excludes.filter(id=task.id).exists()
@@ -376,11 +454,56 @@ class Assignment(models.Model):
 
     class Meta:
         ordering = ["-assigned_at"]
+        constraints = [
+            # One assignment per cell, which makes writes real upserts
+            models.UniqueConstraint(
+                fields=["schedule", "task", "assigned_at"],
+                name="unique_assignment_per_cell",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.assigned_at.strftime('%Y-%m-%d %H:%M')}-{self.task_id} -> {self.user}"
 
 
+class AssignmentChangeManager(models.Manager):
+    def since(self, schedule, version: int) -> dict[str, int | None]:
+        """Latest user id of each cell changed after the given version"""
+        return dict(
+            self.filter(schedule=schedule, version__gt=version)
+            .order_by("version", "id")
+            .values_list("key", "user_id")
+        )
+
+
+class AssignmentChange(models.Model):
+    """
+    Append-only log of the cells changed by each version of a schedule, so
+    clients can catch up on the changes since the version they have
+    """
+
+    schedule = models.ForeignKey(
+        Schedule, on_delete=models.CASCADE, related_name="changes"
+    )
+    version = models.PositiveIntegerField()
+    # Same key as the grid cells, "YYYY-M-D-TASK_ID"
+    key = models.CharField(max_length=64)
+    # None when the cell was cleared
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.SET_NULL, null=True, blank=True
+    )
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    objects = AssignmentChangeManager()
+
+    class Meta:
+        ordering = ["version", "id"]
+        indexes = [models.Index(fields=["schedule", "version"])]
+
+    def __str__(self):
+        return f"{self.schedule_id} v{self.version}: {self.key} -> {self.user_id}"
+
+
 class TaskPreferenceManager(models.Manager):
     def is_eligible(self, user, task):
         """
@@ -397,6 +520,22 @@ class TaskPreferenceManager(models.Manager):
         pref = self.filter(user=user, task_id=task).first()
         return pref.value if pref else 0
 
+    def eligible_users_by_task(self, tasks=None) -> dict[str, list]:
+        """
+        Map of task id to eligible users for all given tasks from a single query.
+        Same eligibility as Task#get_eligible_users
+        """
+        preferences = self.filter(value__gt=0, user__is_active=True).select_related(
+            "user"
+        )
+        if tasks is not None:
+            preferences = preferences.filter(task__in=tasks)
+
+        eligible_users = {}
+        for preference in preferences.order_by("user__last_name", "user__first_name"):
+            eligible_users.setdefault(preference.task_id, []).append(preference.user)
+        return eligible_users
+
 
 class TaskPreference(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
@@ -407,6 +546,15 @@ class TaskPreference(models.Model):
     def __str__(self):
         return f"{self.task_id}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_eligibility_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_eligibility_version()
+        return result
+
     class Meta:
         unique_together = ["user", "task"]
         ordering = ["-updated_at"]
@@ -414,6 +562,55 @@ class TaskPreference(models.Model):
     objects = TaskPreferenceManager()
 
 
+class AssignmentStatsManager(models.Manager):
+    def orphaned(self):
+        """Stats that are no longer part of any schedule's snapshot"""
+        return self.filter(schedule__isnull=True)
+
+    def delete_orphans(self) -> int:
+        """Delete all orphaned stats in bulk, returns the number deleted"""
+        deleted, _ = self.orphaned().delete()
+        return deleted
+
+    def unlink_schedules(self, schedules) -> int:
+        """
+        Remove the given schedules from their stats snapshots and delete the
+        stats that were only referenced by them. Returns the number deleted.
+        """
+        Through = self.model.schedule.through
+        links = Through.objects.filter(schedule__in=schedules)
+        stat_ids = list(links.values_list("assignmentstats_id", flat=True).distinct())
+        links.delete()
+        deleted, _ = self.filter(id__in=stat_ids, schedule__isnull=True).delete()
+        bump_eligibility_version()
+        return deleted
+
+    def latest_official(self, users=None, tasks=None):
+        """
+        The latest stat per (user, task) among stats in official schedule
+        snapshots. Ranks rows with a window function partitioned by the pair,
+        which walks the (user, task, -created_at) index.
+        """
+        in_official_schedule = models.Exists(
+            self.model.schedule.through.objects.filter(
+                assignmentstats_id=models.OuterRef("pk"), schedule__is_official=True
+            )
+        )
+        stats = self.filter(in_official_schedule)
+        if users is not None:
+            stats = stats.filter(user__in=users)
+        if tasks is not None:
+            stats = stats.filter(task__in=tasks)
+
+        return stats.annotate(
+            pair_rank=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F("user_id"), models.F("task_id")],
+                order_by=models.F("created_at").desc(),
+            )
+        ).filter(pair_rank=1)
+
+
 class AssignmentStats(models.Model):
     DECIMAL_PLACES = 8
     MAX_DIGITS = 8 + DECIMAL_PLACES
@@ -444,11 +641,23 @@ class AssignmentStats(models.Model):
         max_digits=1 + DECIMAL_PLACES, decimal_places=DECIMAL_PLACES, null=True
     )
 
+    """ Float copies of the averages above for the solver, which reads thousands
+    of these per run and has no use for Decimal precision or rounding """
+    ideal_average_float = models.FloatField(null=True)
+    actual_average_float = models.FloatField(null=True)
+    assignment_delta_float = models.FloatField(null=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AssignmentStatsManager()
+
     class Meta:
         indexes = [
-            models.Index(fields=["user", "task"]),
+            # latest stat per pair, see AssignmentStatsManager#latest_official
+            models.Index(
+                fields=["user", "task", "-created_at"],
+                name="assignment_stats_latest_idx",
+            ),
             models.Index(fields=["task", "user"]),
             models.Index(fields=["created_at"]),
         ]
@@ -521,4 +730,12 @@ class AssignmentStats(models.Model):
             self.actual_average = self.calculate_actual_average()
         if not self.assignment_delta:
             self.assignment_delta = self.calculate_assignment_delta()
+        self.sync_float_averages()
         super().save(*args, **kwargs)
+        bump_eligibility_version()
+
+    def sync_float_averages(self):
+        """Copy the Decimal averages into their float columns"""
+        self.ideal_average_float = float(self.ideal_average or 0)
+        self.actual_average_float = float(self.actual_average or 0)
+        self.assignment_delta_float = float(self.assignment_delta or 0)
@@ -0,0 +1,123 @@
+import operator
+from datetime import datetime
+from functools import reduce
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from schedules.cache import resolve_user_id
+from schedules.models import Assignment, Schedule, Task
+
+
+class ScheduleVersionConflict(Exception):
+    """The schedule changed since the version an edit was based on"""
+
+    def __init__(self, version):
+        super().__init__(f"schedule is at version {version}")
+        self.version = version
+
+
+def get_assignment_key(date, task_id) -> str:
+    """Same key as the grid cells, see get_service_tables"""
+    return f"{date.year}-{date.month}-{date.day}-{task_id}"
+
+
+def update_assignments_in_schedule(
+    schedule: Schedule,
+    assignment_map: dict[str, int | str | None],
+    expected_version: int | None = None,
+) -> tuple[int, list[str]]:
+    """
+    update assignments in database, in one transaction and a fixed number of
+    queries however many cells changed. Cells map to a user id, an inverted
+    user name ("Last, First") or None to clear them.
+
+    Changed cells are logged under a new version of the schedule. Returns
+    that version and the keys of the cells that were not saved, because the
+    key, its task or its user is unknown. With expected_version, raises
+    ScheduleVersionConflict when the schedule is at another version.
+    """
+    rejected = []
+    removed_cells = {}
+    written_cells = {}
+    for date_task_str, user_id_or_name in assignment_map.items():
+        try:
+            date_str, task_id = date_task_str.rsplit("-", 1)
+            date = datetime.strptime(date_str, "%Y-%m-%d").replace(
+                tzinfo=timezone.get_current_timezone()
+            )
+        except ValueError:
+            rejected.append(date_task_str)
+            continue
+        if user_id_or_name is None:
+            removed_cells[(task_id, date)] = date_task_str
+            continue
+
+        user_id = resolve_user_id(user_id_or_name)
+        if user_id is None:
+            # Partial or unknown name, the client keeps the cell unsaved
+            rejected.append(date_task_str)
+            continue
+        written_cells[(task_id, date)] = (user_id, date_task_str)
+
+    # TODO filter by group
+    user_ids = set(
+        get_user_model()
+        .objects.filter(id__in={user_id for user_id, _ in written_cells.values()})
+        .values_list("id", flat=True)
+    )
+
+    # TODO add schedule to service model
+    # TODO get tasks from schedule's services
+    task_ids = set(
+        Task.objects.filter(
+            id__in={task_id for task_id, _ in [*removed_cells, *written_cells]}
+        ).values_list("id", flat=True)
+    )
+
+    assignments = []
+    for (task_id, date), (user_id, date_task_str) in written_cells.items():
+        if task_id in task_ids and user_id in user_ids:
+            assignments.append(
+                Assignment(
+                    schedule=schedule,
+                    task_id=task_id,
+                    assigned_at=date,
+                    user_id=user_id,
+                )
+            )
+        else:
+            rejected.append(date_task_str)
+
+    removed = []
+    changes = {}
+    for (task_id, date), date_task_str in removed_cells.items():
+        if task_id in task_ids:
+            removed.append(Q(task_id=task_id, assigned_at=date))
+            changes[get_assignment_key(date, task_id)] = None
+        else:
+            rejected.append(date_task_str)
+    for assignment in assignments:
+        changes[get_assignment_key(assignment.assigned_at, assignment.task_id)] = (
+            assignment.user_id
+        )
+
+    with transaction.atomic():
+        # Edits of the same schedule are serialized on its row
+        version = Schedule.objects.lock_version(schedule.pk)
+        if expected_version is not None and expected_version != version:
+            raise ScheduleVersionConflict(version)
+        if not changes:
+            return version, rejected
+
+        if removed:
+            Assignment.objects.filter(schedule=schedule).filter(
+                reduce(operator.or_, removed)
+            ).delete()
+        Assignment.objects.bulk_create(
+            assignments,
+            update_conflicts=True,
+            unique_fields=["schedule", "task", "assigned_at"],
+            update_fields=["user"],
+        )
+        return schedule.record_changes(version, changes), rejected
@@ -0,0 +1,144 @@
+import csv
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from schedules.models import Assignment, AssignmentStats, TaskPreference
+
+# Rows fetched per round trip, through a server-side cursor on Postgres, so
+# exports of any size run in constant memory
+EXPORT_CHUNK_SIZE = 2000
+
+
+def start_of_day(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_assignments(start: date | None, end: date | None) -> Iterator[tuple]:
+    """Assignments made between start and end, with their schedule"""
+    # Bounds on the column itself, unlike __date, can use its index
+    assignments = Assignment.objects.all()
+    if start:
+        assignments = assignments.filter(assigned_at__gte=start_of_day(start))
+    if end:
+        assignments = assignments.filter(
+            assigned_at__lt=start_of_day(end + timedelta(days=1))
+        )
+
+    columns = (
+        "assigned_at",
+        "task_id",
+        "task__service__name",
+        "user_id",
+        "user__last_name",
+        "user__first_name",
+        "schedule_id",
+        "schedule__date",
+        "schedule__is_official",
+    )
+    yield columns
+    yield from assignments.order_by("assigned_at", "id").values_list(*columns).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+
+
+def export_stats(start: date | None, end: date | None) -> Iterator[tuple]:
+    """Assignment stats snapshots of the schedules of months between start and end"""
+    snapshots = AssignmentStats.schedule.through.objects.all()
+    if start:
+        snapshots = snapshots.filter(schedule__date__gte=start.replace(day=1))
+    if end:
+        snapshots = snapshots.filter(schedule__date__lte=end)
+
+    columns = (
+        "schedule_id",
+        "schedule__date",
+        "schedule__is_official",
+        "assignmentstats__task_id",
+        "assignmentstats__user_id",
+        "assignmentstats__ideal_average_float",
+        "assignmentstats__actual_average_float",
+        "assignmentstats__assignment_delta_float",
+    )
+    yield tuple(column.removeprefix("assignmentstats__") for column in columns)
+    yield from snapshots.order_by(
+        "schedule__date", "schedule_id", "assignmentstats_id"
+    ).values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_preferences(start: date | None, end: date | None) -> Iterator[tuple]:
+    """
+    Current task preferences. They are not versioned, so the date range does
+    not apply to them.
+    """
+    columns = (
+        "task_id",
+        "user_id",
+        "user__last_name",
+        "user__first_name",
+        "user__is_active",
+        "value",
+        "updated_at",
+    )
+    yield columns
+    yield from TaskPreference.objects.order_by("task_id", "user_id").values_list(
+        *columns
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+EXPORT_DATASETS = {
+    "assignments": export_assignments,
+    "stats": export_stats,
+    "preferences": export_preferences,
+}
+
+
+def get_export_rows(
+    dataset: str, start: date | None = None, end: date | None = None
+) -> Iterator[tuple]:
+    """Header and rows of a dataset, fetched lazily as they are consumed"""
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(
+            f"Unknown dataset {dataset}, expected one of {', '.join(EXPORT_DATASETS)}"
+        )
+    return EXPORT_DATASETS[dataset](start, end)
+
+
+class Echo:
+    """File-like object that returns what is written, for streaming csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    """CSV lines of rows, one at a time"""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def astream_csv(rows: Iterator[tuple]) -> AsyncIterator[str]:
+    """
+    stream_csv for ASGI, which reads streams asynchronously. Rows are fetched
+    a chunk at a time in the database thread.
+    """
+    writer = csv.writer(Echo())
+    fetch_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    try:
+        while chunk := await fetch_chunk():
+            yield "".join(writer.writerow(row) for row in chunk)
+    finally:
+        # Close the cursor in the thread that opened it
+        await sync_to_async(rows.close)()
+
+
+def write_csv(rows: Iterable[tuple], file) -> int:
+    """Write rows to an open file, returns the number of rows after the header"""
+    writer = csv.writer(file)
+    count = -1
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return max(count, 0)
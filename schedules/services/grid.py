@@ -0,0 +1,191 @@
+from collections import defaultdict
+from schedules.models import AssignmentStats, Schedule, Service, TaskPreference
+from schedules.utils import get_month_service_weeks, get_service_dates
+
+
+def get_service_assignments(schedule: Schedule) -> dict[str, dict]:
+    """Map of service name to a map of assignment key to assigned user"""
+    year = schedule.date.year
+    month = schedule.date.month
+    assignments = schedule.assignments.select_related("task", "user", "task__service")
+
+    service_assignments = defaultdict(dict)
+    for assignment in assignments:
+        assignment_key = (
+            f"{year}-{month}-{assignment.assigned_at.day}-{assignment.task.id}"
+        )
+        service_assignments[assignment.task.service.name][
+            assignment_key
+        ] = assignment.user
+    return service_assignments
+
+
+def get_stats_schedule_id(schedule: Schedule) -> int | None:
+    """The schedule whose stats to show, this one once it has assignments"""
+    if schedule.assignments.exists():
+        return schedule.id
+    return schedule.base_schedule_id
+
+
+def get_assignment_stats_map(stats_schedule_id) -> dict[tuple[str, int], float]:
+    """Map of (task id, user id) to assignment delta in a schedule's stats"""
+    if not stats_schedule_id:
+        return {}
+    return {
+        (task_id, user_id): assignment_delta
+        for task_id, user_id, assignment_delta in AssignmentStats.objects.filter(
+            schedule=stats_schedule_id
+        ).values_list("task_id", "user_id", "assignment_delta_float")
+    }
+
+
+def get_eligible_users_for_task(tasks, assignment_stats_map) -> dict[str, list]:
+    """Map of task id to eligible users sorted by their assignment delta"""
+    eligible_users_by_task = TaskPreference.objects.eligible_users_by_task(tasks)
+    return {
+        task.id: sorted(
+            eligible_users_by_task.get(task.id, []),
+            key=lambda user: assignment_stats_map.get((task.id, user.pk), 1),
+        )
+        for task in tasks
+    }
+
+
+def get_eligible_users_data(eligible_users_for_task) -> dict:
+    """
+    Compact form of eligible users for the page: each user is named once in
+    "users", "tasks" lists user ids in suggestion order
+    """
+    users = {}
+    tasks = {}
+    for task_id, eligible_users in eligible_users_for_task.items():
+        tasks[task_id] = [user.pk for user in eligible_users]
+        for user in eligible_users:
+            users[user.pk] = user.inverted_name()
+    return {"users": users, "tasks": tasks}
+
+
+def get_service_tables(
+    year: int,
+    month: int,
+    services: list[Service],
+    service_weeks: list[list[int]],
+    service_days: set[int],
+    service_assignments: dict[str, dict],
+) -> list[dict]:
+    """
+    Precompute the month schedule grid so templates only iterate.
+
+    Returns one table per service:
+        {
+            "service": service,
+            "header_days": [day or None per service week],
+            "rows": [{"task": task, "cells": [cell per service week]}],
+        }
+    where a cell is {"key": "YYYY-M-D-TASK_ID", "day": day, "user": user, "valid": bool}
+
+    Days must be the same as in Scheduler#get_date_tasks
+    """
+    tables = []
+    for service in services:
+        assignments = service_assignments.get(service.name, {})
+        if service.day_of_week is not None:
+            header_days = [week[service.day_of_week] for week in service_weeks]
+        else:
+            header_days = [None for _ in service_weeks]
+        days = get_service_dates(year, month, service_days, service.day_of_week)
+
+        rows = []
+        for task in service.tasks.all():
+            cells = []
+            for day in days:
+                if day:
+                    key = f"{year}-{month}-{day}-{task.id}"
+                    cells.append(
+                        {
+                            "key": key,
+                            "day": day,
+                            "user": assignments.get(key),
+                            "valid": True,
+                        }
+                    )
+                else:
+                    cells.append(
+                        {"key": None, "day": None, "user": None, "valid": False}
+                    )
+            rows.append({"task": task, "cells": cells})
+
+        tables.append({"service": service, "header_days": header_days, "rows": rows})
+    return tables
+
+
+def get_schedule_grid_data(schedule: Schedule) -> dict:
+    """
+    Compact JSON form of a schedule: its grid, assignments, eligible users and
+    assignment deltas. Users are referenced by id and listed once in "users".
+    """
+    year = schedule.date.year
+    month = schedule.date.month
+    services = Service.objects.prefetch_related("tasks").all()
+    tasks = [task for service in services for task in service.tasks.all()]
+    service_days = {service.day_of_week for service in services}
+    service_weeks = get_month_service_weeks(year, month, service_days)
+    service_tables = get_service_tables(
+        year,
+        month,
+        services,
+        service_weeks,
+        service_days,
+        get_service_assignments(schedule),
+    )
+
+    assignment_stats_map = get_assignment_stats_map(get_stats_schedule_id(schedule))
+    eligible_users_for_task = get_eligible_users_for_task(tasks, assignment_stats_map)
+
+    users = {}
+    assignments = {}
+    for table in service_tables:
+        for row in table["rows"]:
+            for cell in row["cells"]:
+                if cell["user"]:
+                    users[cell["user"].pk] = cell["user"].inverted_name()
+                    assignments[cell["key"]] = cell["user"].pk
+
+    eligible_users_data = get_eligible_users_data(eligible_users_for_task)
+    users.update(eligible_users_data["users"])
+    eligible = eligible_users_data["tasks"]
+    deltas = defaultdict(dict)
+    for task_id, user_ids in eligible.items():
+        for user_id in user_ids:
+            if (task_id, user_id) in assignment_stats_map:
+                deltas[task_id][user_id] = assignment_stats_map[(task_id, user_id)]
+
+    return {
+        "id": schedule.id,
+        "name": schedule.name,
+        "date": schedule.date.isoformat(),
+        "is_official": schedule.is_official,
+        "updated_at": schedule.updated_at.isoformat(),
+        "version": schedule.version,
+        "services": [
+            {
+                "id": table["service"].id,
+                "name": table["service"].name,
+                "day_of_week": table["service"].day_of_week,
+                "days": table["header_days"],
+                "tasks": [
+                    {
+                        "id": row["task"].id,
+                        "name": row["task"].name,
+                        "cells": [cell["key"] for cell in row["cells"]],
+                    }
+                    for row in table["rows"]
+                ],
+            }
+            for table in service_tables
+        ],
+        "assignments": assignments,
+        "users": users,
+        "eligible": eligible,
+        "deltas": deltas,
+    }
@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+from datetime import datetime
+from schedules.cache import resolve_user_id
+from schedules.models import Schedule, Service, TaskPreference
+from schedules.services.assignments import (
+    get_assignment_key,
+    update_assignments_in_schedule,
+)
+from schedules.services.grid import get_service_tables
+from schedules.utils import get_month_service_weeks
+
+IMPORT_FORMATS = ("csv", "json")
+
+
+def parse_assignments_json(content: str) -> list[tuple]:
+    """
+    Rows of the assignment map shape sent by the page,
+    {"YYYY-M-D-TASK_ID": "Last, First" | user id | null}, as (row, key, value)
+    """
+    try:
+        assignment_map = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(assignment_map, dict):
+        raise ValueError("JSON must map assignment keys to users")
+    return [(key, key, value) for key, value in assignment_map.items()]
+
+
+def parse_assignments_csv(schedule: Schedule, content: str) -> list[tuple]:
+    """
+    Rows of a month grid as (row, key, value). A header row starts with
+    "Task" followed by days of the month, each following row with a task id
+    or name followed by the users assigned on those days. Like the printed
+    schedule, a grid may have a table per service, each with its own header.
+    Empty cells are skipped.
+    """
+    tasks = {}
+    for service in Service.objects.prefetch_related("tasks"):
+        for task in service.tasks.all():
+            tasks.setdefault(task.name.lower(), task.id)
+            tasks[task.id.lower()] = task.id
+
+    rows = []
+    days = None
+    reader = csv.reader(io.StringIO(content))
+    for line in reader:
+        if not line or not any(cell.strip() for cell in line):
+            continue
+        label = line[0].strip()
+        if label.lower() == "task":
+            days = [cell.strip() for cell in line[1:]]
+            continue
+        if days is None:
+            raise ValueError("CSV must start with a header row: Task, days...")
+
+        task_id = tasks.get(label.lower(), label)
+        for day, value in zip(days, line[1:]):
+            value = value.strip()
+            if not value:
+                continue
+            key = f"{schedule.date.year}-{schedule.date.month}-{day}-{task_id}"
+            rows.append((reader.line_num, key, value))
+    return rows
+
+
+def parse_assignments(schedule: Schedule, content: str, format: str) -> list[tuple]:
+    if format == "csv":
+        return parse_assignments_csv(schedule, content)
+    if format == "json":
+        return parse_assignments_json(content)
+    raise ValueError(f"Unknown format {format}, expected one of {IMPORT_FORMATS}")
+
+
+def get_schedule_cells(schedule: Schedule) -> dict[str, str]:
+    """Map of the key of every cell of a schedule's grid to its task id"""
+    year = schedule.date.year
+    month = schedule.date.month
+    services = Service.objects.prefetch_related("tasks").all()
+    service_days = {service.day_of_week for service in services}
+    service_tables = get_service_tables(
+        year,
+        month,
+        services,
+        get_month_service_weeks(year, month, service_days),
+        service_days,
+        {},
+    )
+    return {
+        cell["key"]: row["task"].id
+        for table in service_tables
+        for row in table["rows"]
+        for cell in row["cells"]
+        if cell["valid"]
+    }
+
+
+def normalize_assignment_key(key) -> str | None:
+    """Key as in the grid, without zero padding, None when it is not a key"""
+    try:
+        date_str, task_id = str(key).rsplit("-", 1)
+        return get_assignment_key(datetime.strptime(date_str, "%Y-%m-%d"), task_id)
+    except ValueError:
+        return None
+
+
+def validate_assignments(
+    schedule: Schedule, rows: list[tuple]
+) -> tuple[dict[str, int | None], list[dict]]:
+    """
+    Check rows against the schedule's grid and eligibility, in memory after
+    a fixed number of queries. Returns the assignment map of the valid rows
+    and the rejected rows with the reason.
+    """
+    cells = get_schedule_cells(schedule)
+    eligible = {
+        (task_id, user.pk)
+        for task_id, users in TaskPreference.objects.eligible_users_by_task(
+            set(cells.values())
+        ).items()
+        for user in users
+    }
+
+    assignment_map = {}
+    rejected = []
+
+    def reject(row, key, value, error):
+        rejected.append({"row": row, "key": key, "value": value, "error": error})
+
+    for row, key, value in rows:
+        cell_key = normalize_assignment_key(key)
+        if cell_key is None:
+            reject(row, key, value, "Not an assignment key")
+            continue
+        if cell_key not in cells:
+            reject(row, key, value, "No such cell in this schedule")
+            continue
+        if cell_key in assignment_map:
+            reject(row, key, value, "Cell assigned more than once")
+            continue
+        if value is None:
+            # Cleared cells
+            assignment_map[cell_key] = None
+            continue
+
+        user_id = resolve_user_id(value)
+        if user_id is None:
+            reject(row, key, value, "Unknown user")
+        elif (cells[cell_key], user_id) not in eligible:
+            reject(row, key, value, "User is not eligible for this task")
+        else:
+            assignment_map[cell_key] = user_id
+
+    return assignment_map, rejected
+
+
+def import_assignments(
+    schedule: Schedule, rows: list[tuple], dry_run: bool = False
+) -> dict:
+    """
+    Validate rows and write the valid ones in one transaction, see
+    update_assignments_in_schedule. Returns a report:
+        {"version": int, "imported": int, "rejected": [rejected row]}
+    """
+    assignment_map, rejected = validate_assignments(schedule, rows)
+    if dry_run:
+        return {
+            "version": schedule.version,
+            "imported": len(assignment_map),
+            "rejected": rejected,
+        }
+
+    version, rejected_keys = update_assignments_in_schedule(schedule, assignment_map)
+
+    # Cells dropped by the write, e.g. a task or user deleted since validation
+    sources = {}
+    for row, key, value in rows:
+        sources.setdefault(normalize_assignment_key(key), (row, key, value))
+    for cell_key in rejected_keys:
+        row, key, value = sources.get(
+            cell_key, (None, cell_key, assignment_map[cell_key])
+        )
+        rejected.append(
+            {"row": row, "key": key, "value": value, "error": "Could not be saved"}
+        )
+    return {
+        "version": version,
+        "imported": len(assignment_map) - len(rejected_keys),
+        "rejected": rejected,
+    }
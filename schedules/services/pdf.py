@@ -0,0 +1,228 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+import pdfkit
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.template.loader import render_to_string
+from schedules.cache import get_eligibility_version, get_services_version
+from schedules.models import Schedule, Service
+from schedules.services.grid import get_service_assignments, get_service_tables
+from schedules.utils import get_month_calendar, get_month_service_weeks
+
+logger = logging.getLogger(__name__)
+
+# wkhtmltopdf runs in a bounded pool, shared by all requests of this process.
+# Concurrent requests for the same schedule version wait on the same future.
+_executor = None
+_pending: dict[tuple[int, str], Future] = {}
+_lock = threading.Lock()
+
+# Bump when the PDF template, the schedule CSS or PDF_OPTIONS change, so
+# stored PDFs of unchanged schedules are generated again
+PDF_RENDER_VERSION = 1
+
+PDF_OPTIONS = {
+    "page-size": "Legal",
+    "orientation": "Landscape",
+    "encoding": "UTF-8",
+    "no-outline": None,
+    "quiet": "",
+    "disable-external-links": "",
+    "disable-internal-links": "",
+    "enable-local-file-access": "",
+}
+
+
+@cache
+def get_schedule_css() -> str:
+    """The schedule CSS inlined into the PDF, read once per process"""
+    css_path = os.path.join(
+        settings.BASE_DIR, "schedules", "static", "schedules", "schedule.css"
+    )
+    if not os.path.exists(css_path):
+        # Fallback to empty CSS if file not found
+        return ""
+    with open(css_path, "r") as f:
+        return f.read()
+
+
+def get_pdf_storage() -> FileSystemStorage:
+    return FileSystemStorage(location=settings.SCHEDULE_PDF_ROOT)
+
+
+def get_schedule_pdf_version(schedule_id) -> str | None:
+    """
+    Version of a schedule's PDF, which also changes with the users, services
+    and tasks it prints and with how it is rendered
+    """
+    version = Schedule.objects.get_version(schedule_id)
+    if version is None:
+        return None
+    return (
+        f"{version}-{get_eligibility_version()}-{get_services_version()}"
+        f"-{PDF_RENDER_VERSION}"
+    )
+
+
+def get_pdf_filename(schedule: Schedule) -> str:
+    return f"schedule-{schedule.date.month}-{schedule.date.year}.pdf"
+
+
+def render_schedule_html(schedule: Schedule) -> str:
+    year = schedule.date.year
+    month = schedule.date.month
+    _, month_name = get_month_calendar(year, month)
+
+    services = Service.objects.prefetch_related("tasks").all()
+    service_days = {service.day_of_week for service in services}
+    service_weeks = get_month_service_weeks(year, month, service_days)
+
+    context = {
+        "year": year,
+        "month": month,
+        "month_name": month_name,
+        "services": services,
+        "service_days": service_days,
+        "service_weeks": service_weeks,
+        "service_tables": get_service_tables(
+            year,
+            month,
+            services,
+            service_weeks,
+            service_days,
+            get_service_assignments(schedule),
+        ),
+        "css_content": get_schedule_css(),
+        "col_span": len(service_weeks) + len(service_weeks) + 1,
+    }
+    return render_to_string("schedules/pdf_month_schedule.html", context)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SCHEDULE_PDF_WORKERS,
+                thread_name_prefix="schedule-pdf",
+            )
+        return _executor
+
+
+def store_pdf(storage: FileSystemStorage, name: str, pdf: bytes):
+    """
+    Write to a temporary file next to name and rename it, so concurrent
+    renders of the same version replace each other instead of one of them
+    being saved under another name
+    """
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        if storage.file_permissions_mode is not None:
+            os.chmod(temp_path, storage.file_permissions_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_schedule_pdf(
+    html: str, directory: str, name: str, requested_at: float
+) -> bytes:
+    """
+    Run wkhtmltopdf, which takes seconds, and store the result. Runs in the
+    pool, so it gets everything it needs from the database up front.
+    """
+    try:
+        pdf = pdfkit.from_string(html, False, options=PDF_OPTIONS)
+
+        storage = get_pdf_storage()
+        store_pdf(storage, name, pdf)
+
+        # Versions stored before this one was requested can't be served
+        # anymore. Ones stored since may be newer, they are left alone.
+        for filename in storage.listdir(directory)[1]:
+            stored = f"{directory}/{filename}"
+            if (
+                stored != name
+                and filename.endswith(".pdf")
+                and os.path.getmtime(storage.path(stored)) < requested_at
+            ):
+                storage.delete(stored)
+        return pdf
+    except Exception:
+        logger.exception("Could not generate %s", name)
+        raise
+
+
+def request_schedule_pdf(schedule: Schedule, version: str | None = None) -> Future:
+    """
+    Future of the PDF of a schedule, stored under the schedule id and its
+    PDF version so it is only generated again after the schedule changes
+    """
+    if version is None:
+        version = get_schedule_pdf_version(schedule.id)
+
+    key = (schedule.id, version)
+    directory = f"schedule-{schedule.id}"
+    name = f"{directory}/{version}.pdf"
+
+    with _lock:
+        future = _pending.get(key)
+    if future is not None:
+        return future
+
+    storage = get_pdf_storage()
+    if storage.exists(name):
+        future = Future()
+        with storage.open(name, "rb") as f:
+            future.set_result(f.read())
+        return future
+
+    # Rendered in the calling thread, the pool never touches the database
+    requested_at = time.time()
+    html = render_schedule_html(schedule)
+
+    executor = get_executor()
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = executor.submit(
+                write_schedule_pdf, html, directory, name, requested_at
+            )
+            _pending[key] = future
+    # Outside the lock, a future that is already done runs it right away
+    future.add_done_callback(lambda _: _forget(key))
+    return future
+
+
+def _forget(key):
+    with _lock:
+        _pending.pop(key, None)
+
+
+def get_schedule_pdf(
+    schedule: Schedule, version: str | None = None, timeout: float | None = None
+) -> bytes:
+    """
+    The PDF of a schedule, raises concurrent.futures.TimeoutError when it
+    is not ready within timeout seconds
+    """
+    return request_schedule_pdf(schedule, version).result(timeout=timeout)
+
+
+def pregenerate_schedule_pdf(schedule: Schedule) -> Future | None:
+    """Queue the PDF ahead of the first download, failures are only logged"""
+    try:
+        return request_schedule_pdf(schedule)
+    except Exception:
+        logger.exception("Could not pre-generate the PDF of %s", schedule)
+        return None
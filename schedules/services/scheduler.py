@@ -3,12 +3,13 @@ from datetime import datetime, timedelta
 from itertools import chain, zip_longest
 import random
 from django.contrib.auth import get_user_model
-from schedules.models import AssignmentStats, Schedule, Service, Task, TaskPreference
+from schedules.cache import resolve_user_id
+from schedules.models import Schedule, Service, Task, TaskPreference
 from schedules.services.datetask import DateTask
 from schedules.utils import (
-    get_service_day,
     get_month_calendar,
-    get_service_weeks,
+    get_month_service_weeks,
+    get_service_dates,
 )
 from users.models import User
 
@@ -34,21 +35,22 @@ class Scheduler:
         # TODO filter by group
         self.users = get_user_model().objects.filter(is_active=True)
         self.service_days = {service.day_of_week for service in services}
-        self.service_weeks = get_service_weeks(self.month_calendar, self.service_days)
+        self.service_weeks = get_month_service_weeks(
+            self.year, self.month, self.service_days
+        )
         self.date_tasks = self.get_date_tasks()
 
         self.locked_in_assignment_vars = []
+        self.assigned_user_ids = {}
         if locked_in_assignments:
-            self.users_by_inverted_name = {
-                user.inverted_name(): user for user in self.users
-            }
-            self.locked_in_assignment_vars = [
-                (
-                    DateTask.from_str(date_task_str),
-                    self.users_by_inverted_name[user_name],
+            users_by_id = {user.pk: user for user in self.users}
+            for date_task_str, user_id_or_name in locked_in_assignments.items():
+                user = users_by_id.get(resolve_user_id(user_id_or_name))
+                if user is None:
+                    raise ValueError(f"user {user_id_or_name} not found")
+                self.locked_in_assignment_vars.append(
+                    (DateTask.from_str(date_task_str), user)
                 )
-                for date_task_str, user_name in locked_in_assignments.items()
-            ]
 
         # print("date_tasks")
         # print("\n".join([str(dt) for dt in self.date_tasks]))
@@ -71,15 +73,20 @@ class Scheduler:
         self.eligibility = self.get_eligiblity()
 
         # TODO filter by group
-        self.assignment_stats = (
-            schedule.base_schedule.assignment_stats.all().select_related("user", "task")
+        # Only the float columns are read here, the objective is built from
+        # thousands of these and never needs the Decimal display values
+        self.assignment_stats = schedule.base_schedule.assignment_stats.values_list(
+            "user_id", "task_id", "ideal_average_float", "actual_average_float"
         )
-        # Dictionary of dictionaries for user -> task -> assignment_stat
-        self.user_task_stats: defaultdict[int, dict[str, AssignmentStats]] = (
+        # Dictionary of dictionaries for user -> task -> (ideal, actual) averages
+        self.user_task_stats: defaultdict[int, dict[str, tuple[float, float]]] = (
             defaultdict(dict)
         )
-        for stat in self.assignment_stats:
-            self.user_task_stats[stat.user.pk][stat.task.id] = stat
+        for user_id, task_id, ideal_average, actual_average in self.assignment_stats:
+            self.user_task_stats[user_id][task_id] = (
+                ideal_average or 0.0,
+                actual_average or 0.0,
+            )
         # print("user_task_stats")
         # print(self.user_task_stats)
 
@@ -169,10 +176,12 @@ class Scheduler:
                         )
 
         tasks_to_user_name = {}
+        # Same assignments by user id, for writing them without name lookups
         for user in self.users:
             if user.inverted_name() in assignment:
                 for date_task in assignment[user.inverted_name()]:
                     tasks_to_user_name[date_task] = user.inverted_name()
+                    self.assigned_user_ids[str(date_task)] = user.pk
 
         # I don't think we actually need to sort
         sorted_assignments = OrderedDict()
@@ -193,9 +202,9 @@ class Scheduler:
         self.prob += lpSum(
             # maximize the difference between ideal and actual averages
             (
-                float(self.get_ideal_average(user, date_task))
+                self.get_ideal_average(user, date_task)
                 - (
-                    float(self.get_adjusted_actual_average(user, date_task))
+                    self.get_adjusted_actual_average(user, date_task)
                     * self.user_task_preferences[user.pk][date_task.task_id].value
                 )
             )
@@ -212,8 +221,8 @@ class Scheduler:
         if cache_key in self._adjusted_average_cache:
             return self._adjusted_average_cache[cache_key]
 
-        actual = float(self.get_actual_average(user, date_task))
-        ideal = float(self.get_ideal_average(user, date_task))
+        actual = self.get_actual_average(user, date_task)
+        ideal = self.get_ideal_average(user, date_task)
 
         # Very low threshold - only affect users with almost no assignments
         threshold_value = ideal * 0.05  # 5% of ideal
@@ -231,24 +240,24 @@ class Scheduler:
         self._adjusted_average_cache[cache_key] = actual
         return actual
 
-    def get_actual_average(self, user: User, date_task: DateTask):
+    def get_actual_average(self, user: User, date_task: DateTask) -> float:
         if user.pk not in self.user_task_stats:
             print(f"user {user.pk} does not have a task stat")
-            return 0
+            return 0.0
         if date_task.task_id not in self.user_task_stats[user.pk]:
             raise KeyError(
                 f"user {user.pk} does not have a task stat for task {date_task.task_id}"
             )
-        return self.user_task_stats[user.pk][date_task.task_id].actual_average
+        return self.user_task_stats[user.pk][date_task.task_id][1]
 
-    def get_ideal_average(self, user: User, date_task: DateTask):
+    def get_ideal_average(self, user: User, date_task: DateTask) -> float:
         if user.pk not in self.user_task_stats:
-            return 0
+            return 0.0
         if date_task.task_id not in self.user_task_stats[user.pk]:
             raise KeyError(
                 f"user {user.pk} ({user.inverted_name()}) does not have a task stat for task {date_task.task_id}"
             )
-        return self.user_task_stats[user.pk][date_task.task_id].ideal_average
+        return self.user_task_stats[user.pk][date_task.task_id][0]
 
     def constrain_past_assignments(self):
         """Constrain all past assignments variables to 1"""
@@ -481,10 +490,9 @@ class Scheduler:
         date_tasks = []
         for service in self.services:
             for task in service.tasks.all():
-                for service_week in self.service_weeks:
-                    service_day = get_service_day(
-                        service_week, self.service_days, service.day_of_week
-                    )
+                for service_day in get_service_dates(
+                    self.year, self.month, self.service_days, service.day_of_week
+                ):
                     if service_day and service_day != 0:
                         date_tasks.append(
                             DateTask(f"{self.year}-{self.month}-{service_day}", task)
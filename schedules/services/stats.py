@@ -0,0 +1,66 @@
+from decimal import Decimal
+from django.db.models import Q
+from schedules.models import Assignment, AssignmentStats, TaskPreference
+
+
+def get_ideal_averages() -> dict[tuple[int, str], float]:
+    """
+    Ideal averages for every eligible (user_id, task_id) pair from a single query.
+
+    Must be the same logic as AssignmentStats#calculate_ideal_average
+    """
+    preferences = TaskPreference.objects.filter(
+        value__gt=0, user__is_active=True
+    ).values_list("user_id", "task_id", "value")
+
+    total_weights = {}
+    for _, task_id, value in preferences:
+        total_weights[task_id] = total_weights.get(task_id, 0) + value
+
+    return {
+        (user_id, task_id): value / total_weights[task_id]
+        for user_id, task_id, value in preferences
+    }
+
+
+def counted_assignments():
+    """
+    Assignments that count towards stats history: those in official schedules,
+    plus any recorded without a schedule
+    """
+    return Assignment.objects.filter(
+        Q(schedule__is_official=True) | Q(schedule__isnull=True)
+    )
+
+
+def calculate_stats_values(
+    ideal_average: float, user_count: int, task_count: int
+) -> tuple[Decimal, Decimal, Decimal]:
+    """
+    Returns rounded (ideal_average, actual_average, assignment_delta) for a pair.
+
+    Must be the same logic as AssignmentStats#calculate_assignment_delta
+    """
+    places = AssignmentStats.DECIMAL_PLACES
+    ideal = Decimal(round(ideal_average, places))
+    actual = Decimal(round(user_count / task_count if task_count else 0, places))
+    if ideal == Decimal("0"):
+        return ideal, actual, Decimal(0)
+    return ideal, actual, Decimal(round((actual - ideal) / ideal, places))
+
+
+def build_assignment_stats(
+    user_id: int, task_id: str, values: tuple[Decimal, Decimal, Decimal]
+) -> AssignmentStats:
+    """Build an unsaved AssignmentStats with both Decimal and float columns set"""
+    ideal, actual, delta = values
+    return AssignmentStats(
+        user_id=user_id,
+        task_id=task_id,
+        ideal_average=ideal,
+        actual_average=actual,
+        assignment_delta=delta,
+        ideal_average_float=float(ideal),
+        actual_average_float=float(actual),
+        assignment_delta_float=float(delta),
+    )
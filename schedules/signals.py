@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from schedules.cache import (
+    bump_eligibility_version,
+    bump_services_version,
+    invalidate_user_name_index,
+)
+from schedules.models import Service, Task
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Logging in saves last_login, which nothing shows
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    invalidate_user_name_index()
+    # Names are shown in every schedule and inactive users are not eligible
+    bump_eligibility_version()
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(m2m_changed, sender=Task.excludes.through)
+def services_changed(sender, **kwargs):
+    bump_services_version()
@@ -6,7 +6,107 @@ document.addEventListener("DOMContentLoaded", (event) => {
     var toastEl = document.getElementById("toast");
     var assignmentFreqMap = new Map();
     var lastAssignments = {};  // Track last known assignments
-    collectChangedAssignments();
+    // Version of the schedule the page shows, sent with every save
+    var scheduleVersion = parseInt(document.body.dataset.scheduleVersion || "0");
+
+    // In-memory index of the grid, built once on load and kept up to date on
+    // every edit, drag, push and generate result, so nothing rescans the page.
+    // Cells stay in place, their inputs are swapped by drag and drop so they
+    // are looked up in the cell.
+    const cellsByDuty = new Map();      // duty key -> td.duty-cell
+    const assigneeByDuty = new Map();   // duty key -> assignee name
+    const dutiesByAssignee = new Map(); // assignee name -> Set of duty keys
+    const changedDuties = new Set();    // duty keys edited since the last save
+    const highlighted = new Set();      // elements with search-highlight
+
+    document.querySelectorAll("td.duty-cell").forEach((cell) => {
+      const input = cell.querySelector("input.assignment-input");
+      if (cell.dataset.duty && input) {
+        cellsByDuty.set(cell.dataset.duty, cell);
+        setAssignee(cell.dataset.duty, input.value.trim());
+      }
+    });
+    lastAssignments = collectAssignments();
+    changedDuties.clear();
+
+    // Eligible users are sent once for the whole page, the shared datalist
+    // is filled with a task's users when one of its cells gets focus
+    const eligibleUsers = JSON.parse(
+      document.getElementById("eligible-users").textContent
+    );
+    const userIdsByName = new Map(
+      Object.entries(eligibleUsers.users).map(([id, name]) => [name, parseInt(id)])
+    );
+    const eligibleUsersList = document.getElementById("eligible-users-list");
+    let eligibleUsersListTask = null;
+
+    function eligibleUserNames(taskId) {
+      return (eligibleUsers.tasks[taskId] || []).map((id) => eligibleUsers.users[id]);
+    }
+
+    function fillEligibleUsersList(input) {
+      const taskId = input.dataset.task;
+      if (taskId === eligibleUsersListTask) {
+        return;
+      }
+      eligibleUsersListTask = taskId;
+      const options = document.createDocumentFragment();
+      eligibleUserNames(taskId).forEach((name) => {
+        const option = document.createElement("option");
+        option.value = name;
+        options.appendChild(option);
+      });
+      eligibleUsersList.replaceChildren(options);
+    }
+
+    function inputForDuty(dutyKey) {
+      const cell = cellsByDuty.get(dutyKey);
+      return cell ? cell.querySelector("input.assignment-input") : null;
+    }
+
+    function dutyForInput(input) {
+      const cell = input.closest("td.duty-cell");
+      return cell ? cell.dataset.duty : undefined;
+    }
+
+    function setAssignee(dutyKey, assigneeName) {
+      const previous = assigneeByDuty.get(dutyKey);
+      if (previous === assigneeName) {
+        return;
+      }
+      if (previous) {
+        const duties = dutiesByAssignee.get(previous);
+        duties.delete(dutyKey);
+        if (!duties.size) {
+          dutiesByAssignee.delete(previous);
+        }
+      }
+      if (assigneeName) {
+        assigneeByDuty.set(dutyKey, assigneeName);
+        if (!dutiesByAssignee.has(assigneeName)) {
+          dutiesByAssignee.set(assigneeName, new Set());
+        }
+        dutiesByAssignee.get(assigneeName).add(dutyKey);
+      } else {
+        assigneeByDuty.delete(dutyKey);
+      }
+      changedDuties.add(dutyKey);
+    }
+
+    // Index an input's value after the user edited it
+    function indexInput(input) {
+      const dutyKey = dutyForInput(input);
+      if (dutyKey) {
+        setAssignee(dutyKey, input.value.trim());
+      }
+    }
+
+    function setInputValue(input, assigneeName) {
+      input.value = assigneeName;
+      input.setAttribute("value", assigneeName);
+      input.placeholder = assigneeName;
+      input.setAttribute("placeholder", assigneeName);
+    }
   
     function hideToast() {
       toastEl.style.opacity = "0.0";
@@ -27,47 +127,92 @@ document.addEventListener("DOMContentLoaded", (event) => {
     }
 
     function collectAssignments() {
-          return Array.from(document.querySelectorAll('td.duty-cell'))
-            .reduce((obj, cell) => {
-              const input = cell.querySelector('input.assignment-input');
-              if (input && input.value && cell.dataset.duty) {
-                obj[cell.dataset.duty] = input.value;
-              }
-              return obj;
-            }, {})
+      return Object.fromEntries(assigneeByDuty);
     }
 
     function collectChangedAssignments() {
-      const currentAssignments = collectAssignments();
       const changedAssignments = {};
-      
-      // Find assignments that are new or changed
-      for (const [dutyKey, value] of Object.entries(currentAssignments)) {
+
+      // Only cells edited since the last save can differ from it
+      changedDuties.forEach((dutyKey) => {
+        const value = assigneeByDuty.get(dutyKey);
         if (lastAssignments[dutyKey] !== value) {
-          changedAssignments[dutyKey] = value;
+          // Use null to indicate removal
+          changedAssignments[dutyKey] = value || null;
+          if (value) {
+            lastAssignments[dutyKey] = value;
+          } else {
+            delete lastAssignments[dutyKey];
+          }
         }
-      }
-      
-      // Find assignments that were removed
-      for (const [dutyKey, value] of Object.entries(lastAssignments)) {
-        if (!(dutyKey in currentAssignments)) {
-          changedAssignments[dutyKey] = null;  // Use null to indicate removal
+      });
+      changedDuties.clear();
+
+      return changedAssignments;
+    }
+
+    function hideSkeletons() {
+      document.querySelectorAll('.skeleton').forEach(skeleton => {
+        skeleton.classList.remove('visible');
+        const input = skeleton.parentElement.querySelector('input.assignment-input');
+        if (input) {
+          input.style.display = '';
+        }
+      });
+    }
+
+    // Apply a whole generate result in one frame
+    function applyAssignmentMap(assignmentMap) {
+      requestAnimationFrame(() => {
+        hideSkeletons();
+        for (const [dutyKey, assigneeName] of Object.entries(assignmentMap)) {
+          const input = inputForDuty(dutyKey);
+          if (!input) {
+            console.log(`No input found for duty cell ${dutyKey}`);
+            continue;
+          }
+          setInputValue(input, assigneeName);
+          setAssignee(dutyKey, assigneeName);
+          // generate saved it already
+          changedDuties.delete(dutyKey);
+          lastAssignments[dutyKey] = assigneeName;
+        }
+        updateAssignedCount();
+      });
+    }
+
+    // Split a server-sent event stream into {event, data} messages
+    async function* readEvents(res) {
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+          return;
+        }
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+          const message = { event: "message", data: "" };
+          for (const line of buffer.slice(0, end).split("\n")) {
+            if (line.startsWith("event: ")) {
+              message.event = line.slice(7);
+            } else if (line.startsWith("data: ")) {
+              message.data += line.slice(6);
+            }
+          }
+          buffer = buffer.slice(end + 2);
+          yield message;
         }
       }
-      
-      // Update lastAssignments for next comparison
-      lastAssignments = {...currentAssignments};
-      
-      return changedAssignments;
     }
 
     // TODO break functions into other files
     async function generateAssignments() {
       // Show skeletons in empty cells
-      const emptyCells = document.querySelectorAll('td.duty-cell');
-      emptyCells.forEach((cell) => {
-        const input = cell.querySelector('input.assignment-input');
-        if (input && !input.value) {
+      cellsByDuty.forEach((cell, dutyKey) => {
+        const input = cell.querySelector("input.assignment-input");
+        if (input && !assigneeByDuty.has(dutyKey)) {
           const skeleton = cell.querySelector('.skeleton') || document.createElement('div');
           skeleton.className = 'skeleton visible';
           if (!cell.querySelector('.skeleton')) {
@@ -76,62 +221,41 @@ document.addEventListener("DOMContentLoaded", (event) => {
           input.style.display = 'none';
         }
       });
+      showToast("Building model...");
 
-      await fetch(`generate`, {
-        method: "POST",
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(
-          collectAssignments()
-        ),
-      }).then((res) => {
-        console.log(res);
-        showToast("Done.");
-        return res.json().then(data => {
-          const assignmentMap = data.assignment_map;
-          
-          // Hide all skeletons and show inputs
-          document.querySelectorAll('.skeleton').forEach(skeleton => {
-            skeleton.classList.remove('visible');
-            const input = skeleton.parentElement.querySelector('input.assignment-input');
-            if (input) {
-              input.style.display = '';
-            }
-          });
-          
-          // parse results into schedule
-          for (const [dutyKey, assigneeName] of Object.entries(assignmentMap)) {
-            const dutyCells = document.querySelectorAll(`td.duty-cell[data-duty="${dutyKey}"]`);
-            dutyCells.forEach(cell => {
-              const input = cell.querySelector('input.assignment-input');
-              if (input) {
-                input.value = assigneeName;
-                input.setAttribute("value", assigneeName);
-                input.placeholder = assigneeName;
-                input.setAttribute("placeholder", assigneeName);
-              }
-              else {
-                console.log(`No input found for duty cell ${dutyKey}`);
-              }
-              updateAssignedCount();
-            });
-          }
-        }).catch(error => {
-          // Hide skeletons and show inputs on error
-          document.querySelectorAll('.skeleton').forEach(skeleton => {
-            skeleton.classList.remove('visible');
-            const input = skeleton.parentElement.querySelector('input.assignment-input');
-            if (input) {
-              input.style.display = '';
-            }
-          });
-          console.error("Error parsing assignment data:", error);
-          showToast("Error loading assignments");
+      try {
+        const res = await fetch(`generate`, {
+          method: "POST",
+          headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+          },
+          body: JSON.stringify(
+            collectAssignments()
+          ),
         });
-      });
+        for await (const message of readEvents(res)) {
+          const data = JSON.parse(message.data);
+          if (message.event === "model") {
+            showToast(`Solving ${data.variables} assignments...`);
+          } else if (message.event === "solving") {
+            showToast(`Solving... ${data.elapsed}s`);
+          } else if (message.event === "result") {
+            setScheduleVersion(data.version);
+            applyAssignmentMap(data.assignment_map);
+            showToast("Done.");
+          } else if (message.event === "error") {
+            throw new Error(data.error);
+          }
+        }
+      } catch (error) {
+        // Hide skeletons and show inputs on error
+        hideSkeletons();
+        console.error("Error generating assignments:", error);
+        showToast("Error loading assignments");
+      }
     }
-  
+
     async function clear() {
       if (!confirm("Are you sure you want to clear all assignments in this schedule? This action cannot be undone.")) {
         return;
@@ -139,17 +263,19 @@ document.addEventListener("DOMContentLoaded", (event) => {
 
       await fetch("clear", {
         method: "DELETE",
-      }).then((res) => {
+      }).then(async (res) => {
         if (res.status === 200 || res.status === 304) {
+          setScheduleVersion((await res.json()).version);
           setTimeout(() => showToast("Done."), 1000);
           // get all assignments and clear them
-          const assignments = document.querySelectorAll("input.assignment-input");
-          assignments.forEach((assignment) => {
-            assignment.value = "";
-            assignment.setAttribute("value", "");
-            assignment.placeholder = "";
-            assignment.setAttribute("placeholder", "");
+          Array.from(assigneeByDuty.keys()).forEach((dutyKey) => {
+            setInputValue(inputForDuty(dutyKey), "");
+            setAssignee(dutyKey, "");
           });
+          // saved by the clear itself
+          changedDuties.clear();
+          lastAssignments = {};
+          updateAssignedCount();
         }
       });
       showToast("Clearing assignments...");
@@ -161,21 +287,230 @@ document.addEventListener("DOMContentLoaded", (event) => {
         saveTimer = null;
       }
   
-      saveTimer = setTimeout(async function () {
-        await fetch("update", {
+      saveTimer = setTimeout(function () {
+        enqueueChanges(collectChangedAssignments());
+        flushPendingChanges();
+      }, 2000);
+      showToast("Saving...");
+    }
+
+    // Edits wait in a queue persisted in localStorage until the server has
+    // them, so a failed save or a closed tab doesn't lose them. The queue
+    // keeps the latest value per duty key and is sent in batches, retrying
+    // with backoff while the server can't be reached or is overloaded.
+    // The queue is saved with the schedule version its edits were made on,
+    // pendingVersion, and sent with it, so edits restored by a later visit
+    // conflict with anything saved since and go through syncChanges instead
+    // of overwriting it.
+    const PENDING_KEY = `schedule-${document.body.dataset.scheduleId}-pending`;
+    const MAX_BATCH_SIZE = 200;
+    const MAX_RETRY_DELAY_MS = 60000;
+    var [pendingVersion, pendingChanges] = loadPendingChanges();
+    var flushing = false;
+    var retryDelay = 1000;
+    var retryTimer = null;
+
+    function loadPendingChanges() {
+      try {
+        const pending = JSON.parse(localStorage.getItem(PENDING_KEY));
+        if (!pending) {
+          return [scheduleVersion, {}];
+        }
+        if (pending.changes) {
+          return [pending.version, pending.changes];
+        }
+        // Queues saved without their version may be older than any save
+        return [0, pending];
+      } catch (e) {
+        return [scheduleVersion, {}];
+      }
+    }
+
+    function persistPendingChanges() {
+      try {
+        if (Object.keys(pendingChanges).length) {
+          localStorage.setItem(PENDING_KEY, JSON.stringify({
+            version: pendingVersion,
+            changes: pendingChanges,
+          }));
+        } else {
+          localStorage.removeItem(PENDING_KEY);
+        }
+      } catch (e) {
+        console.error("Could not persist pending changes:", e);
+      }
+    }
+
+    function enqueueChanges(changedAssignments) {
+      if (!Object.keys(pendingChanges).length) {
+        pendingVersion = scheduleVersion;
+      }
+      Object.assign(pendingChanges, changedAssignments);
+      persistPendingChanges();
+    }
+
+    // Our version after saving or applying changes. A queue made on the
+    // previous version now holds edits on this one.
+    function setScheduleVersion(version) {
+      if (pendingVersion === scheduleVersion || !Object.keys(pendingChanges).length) {
+        pendingVersion = version;
+        persistPendingChanges();
+      }
+      scheduleVersion = version;
+    }
+
+    async function flushPendingChanges() {
+      if (flushing || !Object.keys(pendingChanges).length) {
+        return;
+      }
+      flushing = true;
+      window.clearTimeout(retryTimer);
+      const batch = Object.fromEntries(
+        Object.entries(pendingChanges).slice(0, MAX_BATCH_SIZE)
+      );
+      let res;
+      try {
+        res = await fetch("update", {
           method: "PUT",
           headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'X-Schedule-Version': pendingVersion,
           },
-          body: JSON.stringify(collectChangedAssignments()),
-        }).then((res) => {
-          if (res.status === 204) {
-            showToast("Saved");
-            updateAssignedCount();
-          }
+          // Users are sent by id where the page knows it
+          body: JSON.stringify(Object.fromEntries(
+            Object.entries(batch).map(([dutyKey, name]) => [
+              dutyKey, (name && userIdsByName.get(name)) || name,
+            ])
+          )),
         });
-      }, 2000);
-      showToast("Saving...");
+      } catch (error) {
+        res = null;  // offline
+      }
+      flushing = false;
+
+      if (res && (res.status === 204 || res.status === 200)) {
+        scheduleVersion = pendingVersion = parseInt(res.headers.get("X-Schedule-Version"));
+        // Cells the server could not save, e.g. an unknown name
+        const rejected = res.status === 200 ? (await res.json()).rejected : [];
+        // Keep cells edited again while the batch was in flight
+        for (const [dutyKey, value] of Object.entries(batch)) {
+          if (pendingChanges[dutyKey] === value) {
+            delete pendingChanges[dutyKey];
+          }
+          markUnsaved(dutyKey, rejected.includes(dutyKey));
+        }
+        persistPendingChanges();
+        retryDelay = 1000;
+        if (rejected.length) {
+          showToast(`${rejected.length} cell${rejected.length === 1 ? "" : "s"} could not be saved`);
+        }
+        if (Object.keys(pendingChanges).length) {
+          flushPendingChanges();
+        } else if (!rejected.length) {
+          showToast("Saved");
+        }
+      } else if (res && res.status === 409 && await syncChanges().catch(() => null)) {
+        // Someone else saved first, we took their changes and keep ours for
+        // the cells they did not touch
+        if (Object.keys(pendingChanges).length) {
+          flushPendingChanges();
+        } else {
+          showToast("Updated with changes from another editor");
+        }
+      } else if (!res || res.status === 409 || res.status === 429 || res.status >= 500) {
+        // Worth another try: offline, busy, or the changes since our version
+        // could not be fetched
+        const count = Object.keys(pendingChanges).length;
+        const reason = res ? "Could not save" : "Offline";
+        showToast(`${reason}, ${count} change${count === 1 ? "" : "s"} waiting to save`);
+        retryTimer = setTimeout(flushPendingChanges, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, MAX_RETRY_DELAY_MS);
+      } else {
+        // The server refused the batch, sending it again would not help.
+        // Drop it from the queue and keep its cells marked unsaved.
+        for (const [dutyKey, value] of Object.entries(batch)) {
+          if (pendingChanges[dutyKey] === value) {
+            delete pendingChanges[dutyKey];
+          }
+          markUnsaved(dutyKey, true);
+        }
+        persistPendingChanges();
+        retryDelay = 1000;
+        const count = Object.keys(batch).length;
+        showToast(`${count} change${count === 1 ? " was" : "s were"} rejected by the server`);
+        if (Object.keys(pendingChanges).length) {
+          flushPendingChanges();
+        }
+      }
+    }
+
+    window.addEventListener("online", flushPendingChanges);
+
+    // Mark a cell the server did not save. Its value no longer counts as
+    // saved, so editing it again sends it even if the value is the same.
+    function markUnsaved(dutyKey, unsaved) {
+      const cell = cellsByDuty.get(dutyKey);
+      if (cell) {
+        cell.classList.toggle("unsaved", unsaved);
+      }
+      if (unsaved) {
+        lastAssignments[dutyKey] = null;
+      }
+    }
+
+    // Apply the changes saved since the version of our pending edits, or of
+    // the page when there are none. Returns them by duty key.
+    async function syncChanges() {
+      const since = Math.min(scheduleVersion, pendingVersion);
+      const res = await fetch(`changes?since=${since}`);
+      const data = await res.json();
+      for (const [dutyKey, userId] of Object.entries(data.changes)) {
+        applyChange(dutyKey, userId ? data.users[userId] : "");
+      }
+      // What is left of the queue is now made on the latest version
+      scheduleVersion = pendingVersion = data.version;
+      persistPendingChanges();
+      updateAssignedCount();
+      return data.changes;
+    }
+
+    // Changes saved by other editors are pushed as they happen, where the
+    // server streams them
+    if (window.EventSource && document.body.dataset.liveUpdates === "true") {
+      const events = new EventSource(`events?since=${scheduleVersion}`);
+      events.addEventListener("changes", (e) => {
+        const data = JSON.parse(e.data);
+        if (data.version <= scheduleVersion) {
+          return;  // already have it, e.g. our own save
+        }
+        for (const [dutyKey, userId] of Object.entries(data.changes)) {
+          applyChange(dutyKey, userId ? data.users[userId] : "");
+        }
+        setScheduleVersion(data.version);
+        updateAssignedCount();
+      });
+    }
+
+    function applyChange(dutyKey, assigneeName) {
+      // Saved by someone else after our unsaved edit, theirs wins
+      if (dutyKey in pendingChanges) {
+        delete pendingChanges[dutyKey];
+        persistPendingChanges();
+      }
+      markUnsaved(dutyKey, false);
+      const input = inputForDuty(dutyKey);
+      if (!input || input === document.activeElement) {
+        return;  // don't change a cell under the cursor
+      }
+      setInputValue(input, assigneeName);
+      setAssignee(dutyKey, assigneeName);
+      // already saved, not an edit of ours
+      changedDuties.delete(dutyKey);
+      if (assigneeName) {
+        lastAssignments[dutyKey] = assigneeName;
+      } else {
+        delete lastAssignments[dutyKey];
+      }
     }
   
     function toggleAssignmentCountVisibility() {
@@ -191,16 +526,8 @@ document.addEventListener("DOMContentLoaded", (event) => {
   
     function updateAssignedCount() {
       assignmentFreqMap.clear();
-      var inputs = Array.from($("input.assignment-input"));
-  
-      inputs.forEach((input) => {
-        const value = input.value.replace(/\(\d+\)/, "");
-  
-        if (assignmentFreqMap.has(value)) {
-          assignmentFreqMap.set(value, assignmentFreqMap.get(value) + 1);
-        } else {
-          assignmentFreqMap.set(value, 1);
-        }
+      dutiesByAssignee.forEach((duties, assigneeName) => {
+        assignmentFreqMap.set(assigneeName, duties.size);
       });
   
       var container = document.querySelector("div.assignment-map");
@@ -228,22 +555,17 @@ document.addEventListener("DOMContentLoaded", (event) => {
   
     function highlightOnMouseover(el) {
       el.addEventListener("mouseenter", (e) => {
-        $(el).addClass("search-highlight");
+        addHighlight(el);
         assignmentInputsByValue(
           el.textContent.replace(/\s\(\d+\)/, ""),
-          (input) => $(input).addClass("search-highlight")
+          addHighlight
         );
       });
     }
   
     function clearHighlightOnMouseout(el) {
       el.addEventListener("mouseleave", (e) => {
-        $(el).removeClass("search-highlight");
-  
-        assignmentInputsByValue(
-          el.textContent.replace(/\s\(\d+\)/, ""),
-          (input) => $(input).removeClass("search-highlight")
-        );
+        clearHighlights();
       });
     }
   
@@ -284,6 +606,9 @@ document.addEventListener("DOMContentLoaded", (event) => {
         this.innerHTML = e.dataTransfer.getData("text/html");
         setupInput(dragSrcEl.querySelector("input"));
         setupInput(this.querySelector("input"));
+        indexInput(dragSrcEl.querySelector("input"));
+        indexInput(this.querySelector("input"));
+        updateAssignedCount();
   
         saveAfterDelay();
       }
@@ -319,47 +644,40 @@ document.addEventListener("DOMContentLoaded", (event) => {
       });
     }
   
-    function filerOnValueOrPlaceholder(el, value) {
-      let placeholder = el.getAttribute("placeholder");
-      return (
-        (el.value != "" || el.placeholder != "" ) && el.value.trim() == value || (placeholder && placeholder.trim() == value)
-      );
-    }
-  
     function assignmentInputsByValue(val, f) {
-      Array.from(
-        $(".assignment-input").filter((_, el) =>
-          filerOnValueOrPlaceholder(el, val)
-        )
-      ).forEach((el) => f(el));
+      (dutiesByAssignee.get(val.trim()) || []).forEach((dutyKey) => {
+        const input = inputForDuty(dutyKey);
+        if (input) {
+          f(input);
+        }
+      });
+    }
+
+    function addHighlight(el) {
+      el.classList.add("search-highlight");
+      highlighted.add(el);
     }
   
     function addMouseOverListener(input) {
       input.addEventListener("mouseover", (event) => {
         // find all inputs with same value and change background
-        let mouseoverValue = input.getAttribute("value");
-  
-        assignmentInputsByValue(mouseoverValue, (el) => {
-          $(el).addClass("search-highlight");
-        });
+        const dutyKey = dutyForInput(input);
+        const mouseoverValue = assigneeByDuty.get(dutyKey);
+        if (mouseoverValue) {
+          assignmentInputsByValue(mouseoverValue, addHighlight);
+        }
       });
     }
   
     function addMouseoutListener(input) {
       input.addEventListener("mouseout", (event) => {
-        // find all inputs with same value and change background
-        let mouseoverValue = input.getAttribute("value").trim();
-  
         clearHighlights();
-        assignmentInputsByValue(mouseoverValue, (el) => {
-          $(el).remove("search-highlight");
-        });
       });
     }
   
     function clearHighlights() {
-      $(".assignment-input").removeClass("search-highlight");
-      $(".assignment-map-entry").removeClass("search-highlight");
+      highlighted.forEach((el) => el.classList.remove("search-highlight"));
+      highlighted.clear();
     }
   
     function setupInput(input) {
@@ -375,9 +693,44 @@ document.addEventListener("DOMContentLoaded", (event) => {
       setupInput(input);
     });
   
-    document.getElementById("download-pdf").onclick = async function () {
-      window.location = "pdf";
-    };
+    // The PDF may still be generating, poll until it is ready then save it
+    async function downloadPdf() {
+      showToast("Preparing PDF...");
+      let response = await fetch("pdf");
+      while (response.status === 202) {
+        const retryAfter = parseInt(response.headers.get("Retry-After") || "2");
+        await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+        response = await fetch("pdf");
+      }
+      if (!response.ok) {
+        showToast("Could not generate PDF");
+        return;
+      }
+      const disposition = response.headers.get("Content-Disposition") || "";
+      const match = disposition.match(/filename="(.+)"/);
+      const link = document.createElement("a");
+      link.href = URL.createObjectURL(await response.blob());
+      link.download = match ? match[1] : "schedule.pdf";
+      link.click();
+      setTimeout(() => URL.revokeObjectURL(link.href), 0);
+    }
+
+    // Show and send edits a previous visit could not save
+    if (Object.keys(pendingChanges).length) {
+      for (const [dutyKey, value] of Object.entries(pendingChanges)) {
+        const input = inputForDuty(dutyKey);
+        if (input) {
+          setInputValue(input, value || "");
+          setAssignee(dutyKey, value || "");
+        }
+      }
+      changedDuties.clear();
+      lastAssignments = collectAssignments();
+      updateAssignedCount();
+      flushPendingChanges();
+    }
+
+    document.getElementById("download-pdf").onclick = downloadPdf;
   
     // document.getElementById("download-pdf").onclick = pdf;
 
@@ -397,6 +750,7 @@ document.addEventListener("DOMContentLoaded", (event) => {
       });
       input.addEventListener("focus", function (e) {
         // console.log("focus");
+        fillEligibleUsersList(e.target);
         e.target.setAttribute("placeholder", e.target.value);
         lastValue = e.target.value;
         e.target.value = "";
@@ -406,6 +760,8 @@ document.addEventListener("DOMContentLoaded", (event) => {
         if (dirty) {
           // console.log("dirty blur: {}", e.target.value);
           dirty = false;
+          indexInput(e.target);
+          updateAssignedCount();
           saveAfterDelay();
           clearHighlights();
         }
@@ -414,6 +770,8 @@ document.addEventListener("DOMContentLoaded", (event) => {
         e.target.value = "";
         e.target.setAttribute("value", "");
         e.target.setAttribute("placeholder", "");
+        indexInput(e.target);
+        updateAssignedCount();
         saveAfterDelay();
         clearHighlights();
       });
@@ -435,12 +793,7 @@ document.addEventListener("DOMContentLoaded", (event) => {
     }
   
     function autocompleteDatalist(input) {
-      const datalist = input.getAttribute("list");
-      const options = Array.from(
-        document.querySelector(`datalist#${datalist}`).options
-      ).map(function (el) {
-        return el.value;
-      });
+      const options = eligibleUserNames(input.dataset.task);
       var relevantOptions = options.filter(function (option) {
         return option.toLowerCase().includes(input.value.toLowerCase());
       });
@@ -1,4 +1,5 @@
 from django import template
+from schedules import utils
 
 register = template.Library()
 
@@ -28,13 +29,7 @@ def get_service_day(service_week, service_days, service_day):
     if service_day is None, return the first calendar day in service_week that is also in service_days.
     Usage: {% get_service_day service_week service_days service_day %}
     """
-    if service_day is not None:
-        return service_week[service_day]
-    else:
-        for i, day in enumerate(service_week):
-            if i in service_days and day != 0:
-                return day
-    return None
+    return utils.get_service_day(service_week, service_days, service_day)
 
 
 @register.filter
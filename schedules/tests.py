@@ -1,11 +1,26 @@
+import calendar
+import csv
 import datetime
+import json
+import shutil
+import tempfile
+import threading
+import time as time_module
 from datetime import time
 from decimal import Decimal
-from django.db import IntegrityError
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.core.cache import cache
+from django.core.management import call_command
 from django.db.models import Count
 from django.forms import ValidationError
-from django.test import TestCase
+from django.template import Context, Template
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from io import StringIO
+from unittest.mock import patch
 from core import models
 from schedules.models import (
     AssignmentStats,
@@ -15,6 +30,27 @@ from schedules.models import (
     TaskPreference,
     Assignment,
 )
+from schedules.cache import resolve_user_id
+from schedules.events import broadcaster, publish_changes
+from schedules.metrics import instrument_templates, metrics_store
+from schedules.services.pdf import (
+    get_pdf_storage,
+    get_schedule_pdf,
+    write_schedule_pdf,
+)
+from schedules.services.assignments import update_assignments_in_schedule
+from schedules.services.exporter import get_export_rows
+from schedules.services.importer import import_assignments
+from schedules.utils import (
+    get_month_calendar,
+    get_month_service_weeks,
+    get_service_dates,
+)
+from schedules.views import (
+    stream_generate_events,
+    stream_schedule_events,
+    stream_schedule_events_sync,
+)
 from users.models import User
 
 
@@ -176,6 +212,19 @@ class AssignmentTestCase(TestCase):
             f"{now.strftime('%Y-%m-%d %H:%M')}-test_task_id_1 -> Test User",
         )
 
+    def test_one_assignment_per_cell(self):
+        schedule = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user
+        )
+        now = timezone.now()
+        Assignment.objects.create(
+            user=self.user, task=self.task1, assigned_at=now, schedule=schedule
+        )
+        with self.assertRaises(IntegrityError):
+            Assignment.objects.create(
+                user=self.user, task=self.task1, assigned_at=now, schedule=schedule
+            )
+
 
 class TaskPreferenceTestCase(TestCase):
     def setUp(self):
@@ -482,6 +531,25 @@ class AssignmentStatsTestCase(TestCase):
             stats2.assignment_delta, Decimal("-0.33333334"), places=8
         )
 
+    def test_float_averages_mirror_decimals(self):
+        Assignment.objects.create(
+            user=self.user1, task=self.task, assigned_at=timezone.now()
+        )
+        Assignment.objects.create(
+            user=self.user2, task=self.task, assigned_at=timezone.now()
+        )
+        Assignment.objects.create(
+            user=self.user2, task=self.task, assigned_at=timezone.now()
+        )
+
+        stats = AssignmentStats.objects.create(user=self.user1, task=self.task)
+        stats.refresh_from_db()
+
+        self.assertAlmostEqual(stats.ideal_average_float, 0.5)
+        self.assertAlmostEqual(stats.actual_average_float, 0.33333333)
+        self.assertAlmostEqual(stats.assignment_delta_float, -0.33333334)
+        self.assertIsInstance(stats.actual_average_float, float)
+
     def test_ideal_average_with_preferences(self):
         # Create a third user with different preference
         user3 = User.objects.create_user(
@@ -572,6 +640,11 @@ class AssignmentStatsTestCase(TestCase):
 
 class ScheduleTestCase(TestCase):
     def setUp(self):
+        # PDFs are covered by SchedulePdfTestCase, don't run wkhtmltopdf here
+        patcher = patch("schedules.services.pdf.pregenerate_schedule_pdf")
+        self.pregenerate_schedule_pdf = patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.user1 = User.objects.create_user(
             email="user1@example.com",
             first_name="User",
@@ -689,6 +762,7 @@ class ScheduleTestCase(TestCase):
         # Check that the first one is selected
         self.assertTrue(schedule1.is_official)
         self.assertFalse(schedule2.is_official)
+        self.pregenerate_schedule_pdf.assert_called_once_with(schedule1)
 
         # Mark the second one as selected
         schedule2.select_as_official()
@@ -748,3 +822,1025 @@ class ScheduleTestCase(TestCase):
         schedule.is_official = True
         schedule.save()
         self.assertEqual(str(schedule), "Test Schedule (Selected) - June 2023")
+
+
+class AssignmentStatsCleanupTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user1@example.com", first_name="User", last_name="One"
+        )
+        self.service = Service.objects.create(
+            name="Test Service", day_of_week=0, start_time=time(9, 0)
+        )
+        self.task = Task.objects.create(
+            name="Test Task", id="test_task_id", service=self.service
+        )
+        TaskPreference.objects.create(user=self.user, task=self.task, value=1.0)
+
+        self.may = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user
+        )
+        self.june = Schedule.objects.create(
+            name="June 2023", date=datetime.date(2023, 6, 1), user=self.user
+        )
+        self.shared = AssignmentStats.objects.create(user=self.user, task=self.task)
+        self.shared.schedule.add(self.may, self.june)
+        self.june_only = AssignmentStats.objects.create(user=self.user, task=self.task)
+        self.june_only.schedule.add(self.june)
+
+    def test_cleanup_keeps_shared_stats(self):
+        self.june._cleanup_old_stats()
+
+        self.assertTrue(AssignmentStats.objects.filter(id=self.shared.id).exists())
+        self.assertFalse(AssignmentStats.objects.filter(id=self.june_only.id).exists())
+        self.assertEqual(list(self.may.assignment_stats.all()), [self.shared])
+        self.assertFalse(self.june.assignment_stats.exists())
+
+    def test_delete_orphans(self):
+        orphan = AssignmentStats.objects.create(user=self.user, task=self.task)
+
+        self.assertEqual(AssignmentStats.objects.delete_orphans(), 1)
+        self.assertFalse(AssignmentStats.objects.filter(id=orphan.id).exists())
+        self.assertEqual(AssignmentStats.objects.count(), 2)
+
+    def test_compact_releases_expired_drafts(self):
+        Schedule.objects.filter(id=self.may.id).update(
+            updated_at=timezone.now() - datetime.timedelta(days=365)
+        )
+
+        call_command("compact_assignment_stats", stdout=StringIO())
+
+        self.assertFalse(self.may.assignment_stats.exists())
+        self.assertEqual(
+            set(self.june.assignment_stats.all()), {self.shared, self.june_only}
+        )
+
+    def test_compact_keeps_latest_official(self):
+        Schedule.objects.update(is_official=True)
+
+        call_command("compact_assignment_stats", keep_official=1, stdout=StringIO())
+
+        self.assertFalse(self.may.assignment_stats.exists())
+        self.assertEqual(AssignmentStats.objects.count(), 2)
+
+    def test_latest_official(self):
+        Schedule.objects.filter(id=self.june.id).update(is_official=True)
+        draft_stat = AssignmentStats.objects.create(user=self.user, task=self.task)
+        draft_stat.schedule.add(self.may)
+
+        latest = list(AssignmentStats.objects.latest_official())
+
+        self.assertEqual(latest, [self.june_only])
+        self.assertEqual(
+            list(AssignmentStats.objects.latest_official(users=[self.user.id])),
+            [self.june_only],
+        )
+        self.assertFalse(AssignmentStats.objects.latest_official(tasks=[]).exists())
+
+
+class ReportAssignmentStatsTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email="user1@example.com", first_name="User", last_name="One"
+        )
+        self.user2 = User.objects.create_user(
+            email="user2@example.com", first_name="User", last_name="Two"
+        )
+        service = Service.objects.create(
+            name="Test Service", day_of_week=0, start_time=time(9, 0)
+        )
+        self.task = Task.objects.create(
+            name="Test Task", id="test_task_id", service=service
+        )
+        TaskPreference.objects.create(user=self.user1, task=self.task, value=1.0)
+        TaskPreference.objects.create(user=self.user2, task=self.task, value=1.0)
+        self.schedule = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user1
+        )
+        Schedule.objects.update(is_official=True)
+
+        stat = AssignmentStats.objects.create(
+            user=self.user1,
+            task=self.task,
+            ideal_average=Decimal("0.5"),
+            actual_average=Decimal("1"),
+        )
+        stat.schedule.add(self.schedule)
+
+    def test_report(self):
+        out = StringIO()
+        call_command("report_assignment_stats", stdout=out)
+        report = out.getvalue()
+
+        self.assertIn("Assignment Stats Report: May 2023", report)
+        self.assertIn("One, User: test_task_id +1.000", report)
+        self.assertIn("Two, User: test_task_id (no stats at all)", report)
+        self.assertIn("Delta distribution", report)
+
+
+class CalendarTestCase(SimpleTestCase):
+    def test_month_calendar_starts_on_sunday(self):
+        self.addCleanup(calendar.setfirstweekday, calendar.firstweekday())
+        calendar.setfirstweekday(calendar.MONDAY)
+
+        weeks, month_name = get_month_calendar(2023, 5)
+
+        self.assertEqual(month_name, "May")
+        self.assertEqual(weeks[0], (0, 1, 2, 3, 4, 5, 6))
+        self.assertIs(get_month_calendar(2023, 5)[0], weeks)
+
+    def test_service_dates(self):
+        self.assertEqual(
+            get_month_service_weeks(2023, 4, {0}),
+            get_month_service_weeks(2023, 4, [0]),
+        )
+        self.assertEqual(len(get_month_service_weeks(2023, 4, {0})), 5)
+        self.assertEqual(get_service_dates(2023, 4, {0, 3}, 3), (5, 12, 19, 26, 0))
+        self.assertEqual(
+            get_service_dates(2023, 4, {0, 3, None}, None), (2, 9, 16, 23, 30)
+        )
+
+
+class MonthViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user1@example.com", first_name="User", last_name="One"
+        )
+        # the month template lays out four services
+        for day_of_week in (0, 3, None, 6):
+            self.service = Service.objects.create(
+                name=f"Service {day_of_week}",
+                day_of_week=day_of_week,
+                start_time=time(9, 0),
+            )
+        self.schedule = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user
+        )
+        self.add_task("task_0")
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def add_task(self, task_id):
+        task = Task.objects.create(name=task_id, id=task_id, service=self.service)
+        user = User.objects.create_user(
+            email=f"{task_id}@example.com", first_name=task_id, last_name="User"
+        )
+        TaskPreference.objects.create(user=user, task=task, value=1.0)
+        TaskPreference.objects.create(user=self.user, task=task, value=1.0)
+        Assignment.objects.create(
+            user=user,
+            task=task,
+            schedule=self.schedule,
+            assigned_at=timezone.make_aware(datetime.datetime(2023, 5, 6)),
+        )
+        return task
+
+    def get_query_count(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/schedules/{self.schedule.id}/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_eligible_users_sorted_by_delta(self):
+        task = Task.objects.get(id="task_0")
+        other = User.objects.get(first_name="task_0")
+        stat = AssignmentStats.objects.create(
+            user=self.user, task=task, assignment_delta=Decimal("0.5")
+        )
+        stat.schedule.add(self.schedule)
+        stat = AssignmentStats.objects.create(
+            user=other, task=task, assignment_delta=Decimal("-0.5")
+        )
+        stat.schedule.add(self.schedule)
+
+        response = self.client.get(f"/schedules/{self.schedule.id}/")
+
+        self.assertEqual(
+            response.context["eligible_users_for_task"]["task_0"], [other, self.user]
+        )
+
+    def test_eligible_users_delivered_once(self):
+        other = User.objects.get(first_name="task_0")
+        self.add_task("task_1")
+
+        content = self.client.get(f"/schedules/{self.schedule.id}/").content.decode()
+
+        start = content.index('<script id="eligible-users" type="application/json">')
+        data = json.loads(
+            content[content.index(">", start) + 1 : content.index("</script>", start)]
+        )
+        self.assertEqual(data["tasks"]["task_0"], [self.user.pk, other.pk])
+        self.assertEqual(data["users"][str(self.user.pk)], "One, User")
+        self.assertEqual(content.count("<option"), 0)
+
+    def test_query_count_does_not_grow_with_tasks(self):
+        query_count = self.get_query_count()
+
+        for i in range(1, 6):
+            self.add_task(f"task_{i}")
+
+        self.assertEqual(self.get_query_count(), query_count)
+
+    def test_fragments_cached_until_assignments_change(self):
+        url = f"/schedules/{self.schedule.id}/"
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertLess(len(queries), self.get_query_count())
+        self.assertContains(response, 'data-task="task_0" value="User, task_0"')
+
+        update_assignments_in_schedule(self.schedule, {"2023-5-6-task_0": None})
+        response = self.client.get(url)
+        self.assertNotContains(response, 'data-task="task_0" value="User, task_0"')
+
+    def test_update_assignments_in_schedule(self):
+        task = Task.objects.get(id="task_0")
+        _, rejected = update_assignments_in_schedule(
+            self.schedule,
+            {
+                "2023-5-6-task_0": "One, User",
+                "2023-5-13-task_0": "User, task_0",
+                "2023-5-20-task_0": "Unknown, Person",
+                "2023-5-27-task_0": "partial",
+            },
+        )
+        self.assertEqual(rejected, ["2023-5-20-task_0", "2023-5-27-task_0"])
+
+        assignments = self.schedule.assignments.filter(task=task)
+        self.assertEqual(
+            [
+                (assignment.assigned_at.day, assignment.user.last_name)
+                for assignment in assignments.order_by("assigned_at")
+            ],
+            [(6, "One"), (13, "User")],
+        )
+
+    def test_update_assignments_by_user_id(self):
+        _, rejected = update_assignments_in_schedule(
+            self.schedule,
+            {
+                "2023-5-13-task_0": self.user.pk,
+                "2023-5-20-task_0": str(self.user.pk),
+                "2023-5-27-task_0": 0,
+            },
+        )
+        self.assertEqual(rejected, ["2023-5-27-task_0"])
+
+        self.assertEqual(
+            sorted(
+                self.schedule.assignments.filter(user=self.user).values_list(
+                    "assigned_at__day", flat=True
+                )
+            ),
+            [13, 20],
+        )
+
+    def test_import_schedule_csv(self):
+        content = (
+            "Task,6,13,14\n"
+            'task_0,"One, User","Nobody, Here","One, User"\n'
+            "\n"
+            "Task,20\n"
+            'task_0,"User, task_0"\n'
+        )
+
+        response = self.client.post(
+            f"/schedules/{self.schedule.id}/import",
+            content,
+            content_type="text/csv",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["imported"], 2)
+        self.assertEqual(
+            [(row["row"], row["error"]) for row in response.json()["rejected"]],
+            [(2, "Unknown user"), (2, "No such cell in this schedule")],
+        )
+        self.assertEqual(
+            sorted(
+                self.schedule.assignments.values_list(
+                    "assigned_at__day", "user__last_name"
+                )
+            ),
+            [(6, "One"), (20, "User")],
+        )
+
+    def test_import_schedule_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = f"/schedules/{self.schedule.id}/import"
+        content = json.dumps({"2023-5-13-task_0": self.user.pk})
+
+        response = client.post(url, content, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.version, 0)
+
+        token = "a" * 32
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = client.post(
+            url,
+            content,
+            content_type="application/json",
+            headers={"x-csrftoken": token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 1)
+
+    def test_import_reports_cells_dropped_by_the_write(self):
+        rows = [(2, "2023-5-13-task_0", "One, User")]
+        # The user is deleted between validation and the write
+        with patch(
+            "schedules.services.importer.validate_assignments",
+            return_value=({"2023-5-13-task_0": 0}, []),
+        ):
+            report = import_assignments(self.schedule, rows)
+
+        self.assertEqual(report["imported"], 0)
+        self.assertEqual(
+            report["rejected"],
+            [
+                {
+                    "row": 2,
+                    "key": "2023-5-13-task_0",
+                    "value": "One, User",
+                    "error": "Could not be saved",
+                }
+            ],
+        )
+
+    def test_import_schedule_json(self):
+        stranger = User.objects.create_user(
+            email="stranger@example.com", first_name="A", last_name="Stranger"
+        )
+
+        response = self.client.post(
+            f"/schedules/{self.schedule.id}/import",
+            {
+                "2023-05-06-task_0": None,
+                "2023-5-13-task_0": self.user.pk,
+                "2023-5-20-task_0": stranger.pk,
+                "2023-5-27-task_9": self.user.pk,
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.json()["imported"], 2)
+        self.assertEqual(
+            [row["error"] for row in response.json()["rejected"]],
+            ["User is not eligible for this task", "No such cell in this schedule"],
+        )
+        self.assertEqual(
+            list(self.schedule.assignments.values_list("assigned_at__day", "user")),
+            [(13, self.user.pk)],
+        )
+        self.assertEqual(
+            self.client.post(
+                f"/schedules/{self.schedule.id}/import",
+                "[",
+                content_type="application/json",
+            ).status_code,
+            400,
+        )
+
+    def test_import_assignments_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write('Task,13\ntask_0,"One, User"\n')
+            f.flush()
+            out = StringIO()
+            call_command(
+                "import_assignments", self.schedule.id, f.name, dry_run=True, stdout=out
+            )
+            self.assertIn("Would import 1 of 1 cells", out.getvalue())
+            self.assertFalse(self.schedule.assignments.filter(user=self.user).exists())
+
+            call_command(
+                "import_assignments", self.schedule.id, f.name, stdout=StringIO()
+            )
+        self.assertTrue(
+            self.schedule.assignments.filter(
+                user=self.user, assigned_at__day=13
+            ).exists()
+        )
+
+    def test_export_history(self):
+        stat = AssignmentStats.objects.create(
+            user=self.user,
+            task=Task.objects.get(id="task_0"),
+            assignment_delta=Decimal("0.5"),
+        )
+        stat.schedule.add(self.schedule)
+
+        response = self.client.get(
+            "/schedules/export/assignments.csv", {"start": "2023-05-01"}
+        )
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(rows[0][:2], ["assigned_at", "task_id"])
+        self.assertEqual([row[1] for row in rows[1:]], ["task_0"])
+
+        response = self.client.get(
+            "/schedules/export/assignments.csv", {"start": "2023-06-01"}
+        )
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+        response = self.client.get("/schedules/export/stats.csv")
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(rows[1][3:5], ["task_0", str(self.user.pk)])
+
+        self.assertEqual(
+            self.client.get("/schedules/export/users.csv").status_code, 400
+        )
+        self.assertEqual(
+            self.client.get("/schedules/export/stats.csv", {"end": "May"}).status_code,
+            400,
+        )
+
+    @patch("schedules.services.exporter.EXPORT_CHUNK_SIZE", 1)
+    async def test_export_history_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get("/schedules/export/preferences.csv")
+
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(b"".join(chunks).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ["task_id", "user_id"])
+        self.assertEqual(len(rows), 3)
+
+    def test_export_assignments_end_includes_the_whole_day(self):
+        Assignment.objects.update(
+            assigned_at=timezone.make_aware(datetime.datetime(2023, 5, 31, 23, 30))
+        )
+
+        rows = list(get_export_rows("assignments", end=datetime.date(2023, 5, 31)))
+        self.assertEqual(len(rows), 2)
+        rows = list(get_export_rows("assignments", end=datetime.date(2023, 5, 30)))
+        self.assertEqual(len(rows), 1)
+        rows = list(get_export_rows("assignments", start=datetime.date(2023, 6, 1)))
+        self.assertEqual(len(rows), 1)
+
+    def test_export_history_command(self):
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output)
+
+        out = StringIO()
+        call_command(
+            "export_history", output, end=datetime.date(2023, 5, 31), stdout=out
+        )
+
+        self.assertIn("Exported 1 assignments", out.getvalue())
+        self.assertIn("Exported 2 preferences", out.getvalue())
+        with open(f"{output}/preferences.csv") as f:
+            self.assertEqual(len(list(csv.reader(f))), 3)
+
+    @override_settings(SCHEDULE_PERFORMANCE_BUDGETS={"queries": 1, "total_ms": None})
+    def test_performance_budget_logged(self):
+        with self.assertLogs("schedules.middleware", "WARNING") as logs:
+            response = self.client.get(f"/schedules/{self.schedule.id}/")
+
+        self.assertIn("(schedules:month_view) over budget: queries", logs.output[0])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    def test_templates_instrumented_once(self):
+        render = Template.render
+        instrument_templates()
+        self.assertIs(Template.render, render)
+
+        # Only renders inside a measured request are timed
+        self.assertEqual(Template("{{ a }}").render(Context({"a": 1})), "1")
+
+    def test_performance_percentiles(self):
+        metrics_store.clear()
+        self.addCleanup(metrics_store.clear)
+        for _ in range(3):
+            self.client.get(f"/schedules/{self.schedule.id}/")
+
+        response = self.client.get("/schedules/performance")
+        self.assertEqual(response.status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        views = self.client.get("/schedules/performance").json()["views"]
+
+        month_view = views["schedules:month_view"]
+        self.assertEqual(month_view["count"], 3)
+        self.assertGreater(month_view["queries"]["max"], 0)
+        self.assertGreater(month_view["template_ms"]["p99"], 0)
+        self.assertLessEqual(
+            month_view["total_ms"]["p50"], month_view["total_ms"]["max"]
+        )
+
+    def test_changes_since_version(self):
+        other = User.objects.get(first_name="task_0")
+        version, _ = update_assignments_in_schedule(
+            self.schedule, {"2023-5-13-task_0": self.user.pk}
+        )
+        self.assertEqual(version, 1)
+        self.assertEqual(
+            update_assignments_in_schedule(
+                self.schedule,
+                {"2023-5-13-task_0": other.pk, "2023-5-6-task_0": None},
+            ),
+            (2, []),
+        )
+
+        response = self.client.get(
+            f"/schedules/{self.schedule.id}/changes", {"since": version}
+        )
+
+        self.assertEqual(
+            response.json(),
+            {
+                "version": 2,
+                "changes": {"2023-5-13-task_0": other.pk, "2023-5-6-task_0": None},
+                "users": {str(other.pk): "User, task_0"},
+            },
+        )
+
+    def test_update_schedule_version_conflict(self):
+        url = f"/schedules/{self.schedule.id}/update"
+        update_assignments_in_schedule(self.schedule, {"2023-5-6-task_0": None})
+
+        response = self.client.put(
+            url,
+            {"2023-5-13-task_0": self.user.pk},
+            content_type="application/json",
+            headers={"x-schedule-version": "0"},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], 1)
+        self.assertFalse(self.schedule.assignments.filter(user=self.user).exists())
+
+        response = self.client.put(
+            url,
+            {"2023-5-13-task_0": self.user.pk},
+            content_type="application/json",
+            headers={"x-schedule-version": "1"},
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["X-Schedule-Version"], "2")
+
+    def test_update_schedule_bad_request(self):
+        url = f"/schedules/{self.schedule.id}/update"
+
+        for body, version in (("{", "0"), ("[1]", "0"), ("{}", "one")):
+            response = self.client.put(
+                url,
+                body,
+                content_type="application/json",
+                headers={"x-schedule-version": version},
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_update_schedule_reports_rejected_cells(self):
+        response = self.client.put(
+            f"/schedules/{self.schedule.id}/update",
+            {
+                "2023-5-13-task_0": self.user.pk,
+                "2023-5-20-task_0": "Nobody, Here",
+                "2023-5-27-task_9": self.user.pk,
+                "not-a-key": None,
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            response.json()["rejected"],
+            ["not-a-key", "2023-5-20-task_0", "2023-5-27-task_9"],
+        )
+        self.assertEqual(response["X-Schedule-Version"], "1")
+        self.assertTrue(self.schedule.assignments.filter(user=self.user).exists())
+
+    def test_changes_published_on_commit(self):
+        with patch("schedules.models.publish_changes") as publish_changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                update_assignments_in_schedule(
+                    self.schedule, {"2023-5-13-task_0": self.user.pk}
+                )
+
+        publish_changes.assert_called_once_with(
+            self.schedule.id, 1, {"2023-5-13-task_0": self.user.pk}
+        )
+
+    async def test_schedule_events(self):
+        await sync_to_async(update_assignments_in_schedule)(
+            self.schedule, {"2023-5-13-task_0": self.user.pk}
+        )
+        events = stream_schedule_events(self.schedule.id, 0)
+
+        self.assertEqual(await anext(events), "retry: 3000\n\n")
+        # catches up on the changes since the given version
+        event = await anext(events)
+        self.assertTrue(event.startswith("id: 1\nevent: changes\n"))
+        self.assertIn(f'"2023-5-13-task_0": {self.user.pk}', event)
+
+        await sync_to_async(publish_changes)(
+            self.schedule.id, 2, {"2023-5-13-task_0": None}
+        )
+        event = await anext(events)
+        self.assertIn('"changes": {"2023-5-13-task_0": null}', event)
+
+        await events.aclose()
+        self.assertFalse(broadcaster.has_subscribers(self.schedule.id))
+
+    def test_schedule_events_sync(self):
+        update_assignments_in_schedule(
+            self.schedule, {"2023-5-13-task_0": self.user.pk}
+        )
+        events = stream_schedule_events_sync(self.schedule.id, 0)
+
+        self.assertEqual(next(events), "retry: 3000\n\n")
+        self.assertTrue(next(events).startswith("id: 1\nevent: changes\n"))
+
+        publish_changes(self.schedule.id, 2, {"2023-5-13-task_0": None})
+        self.assertIn('"changes": {"2023-5-13-task_0": null}', next(events))
+
+        events.close()
+        self.assertFalse(broadcaster.has_subscribers(self.schedule.id))
+
+    @override_settings(SCHEDULE_EVENTS_WSGI=True)
+    @patch("schedules.views.stream_schedule_events_sync")
+    def test_schedule_events_under_wsgi(self, stream_schedule_events_sync):
+        stream_schedule_events_sync.return_value = iter(["retry: 3000\n\n"])
+
+        response = self.client.get(f"/schedules/{self.schedule.id}/events")
+
+        # Django only streams sync iterators under WSGI
+        self.assertFalse(response.is_async)
+        self.assertEqual(b"".join(response.streaming_content), b"retry: 3000\n\n")
+        stream_schedule_events_sync.assert_called_once_with(self.schedule.id, 0)
+
+    async def test_schedule_events_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(f"/schedules/{self.schedule.id}/events")
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(await anext(response.streaming_content), b"retry: 3000\n\n")
+        await response.streaming_content.aclose()
+
+    @override_settings(SCHEDULE_EVENTS_WSGI=False)
+    def test_schedule_events_off_under_wsgi(self):
+        response = self.client.get(f"/schedules/{self.schedule.id}/events")
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(f"/schedules/{self.schedule.id}/")
+        self.assertContains(response, 'data-live-updates="false"')
+
+    def mock_generate(self, Scheduler):
+        def solve():
+            threading.Event().wait(0.05)
+            return 1, {"2023-5-13-task_0": "One, User"}
+
+        scheduler = Scheduler.return_value
+        scheduler.x = {}
+        scheduler.prob.constraints = {}
+        scheduler.solve.side_effect = solve
+        scheduler.assigned_user_ids = {"2023-5-13-task_0": self.user.pk}
+
+    def assertGenerateEvents(self, content: bytes):
+        events = [event.split("\n") for event in content.decode().strip().split("\n\n")]
+        names = [event[0] for event in events]
+        self.assertEqual(names[0], "event: model")
+        self.assertIn("event: solving", names)
+        self.assertEqual(names[-1], "event: result")
+        self.assertEqual(
+            json.loads(events[-1][1].removeprefix("data: ")),
+            {
+                "result": 1,
+                "assignment_map": {"2023-5-13-task_0": "One, User"},
+                "version": 1,
+            },
+        )
+
+    @patch("schedules.views.GENERATE_HEARTBEAT_SECONDS", 0.01)
+    @patch("schedules.views.Scheduler")
+    def test_generate_streams_progress(self, Scheduler):
+        self.mock_generate(Scheduler)
+
+        response = self.client.post(
+            f"/schedules/{self.schedule.id}/generate",
+            {},
+            content_type="application/json",
+            headers={"accept": "text/event-stream"},
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertFalse(response.is_async)
+        self.assertGenerateEvents(b"".join(response.streaming_content))
+        self.assertTrue(self.schedule.assignments.filter(user=self.user).exists())
+
+    def test_generate_unknown_locked_in_user(self):
+        response = self.client.post(
+            f"/schedules/{self.schedule.id}/generate",
+            {"2023-5-13-task_0": "Nobody, Here"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "user Nobody, Here not found")
+
+    @patch("schedules.views.GENERATE_HEARTBEAT_SECONDS", 0.01)
+    @patch("schedules.views.Scheduler")
+    def test_generate_stream_closed_while_solving(self, Scheduler):
+        solved = threading.Event()
+        self.addCleanup(solved.set)
+        scheduler = Scheduler.return_value
+        scheduler.x = {}
+        scheduler.prob.constraints = {}
+        scheduler.solve.side_effect = lambda: solved.wait(5)
+
+        events = stream_generate_events(self.schedule, [], {})
+        self.assertTrue(next(events).startswith("event: model"))
+        self.assertTrue(next(events).startswith("event: solving"))
+
+        # Closing doesn't wait for the solve
+        started = time_module.monotonic()
+        events.close()
+        self.assertLess(time_module.monotonic() - started, 1)
+        self.assertFalse(solved.is_set())
+
+    @patch("schedules.views.GENERATE_HEARTBEAT_SECONDS", 0.01)
+    @patch("schedules.views.Scheduler")
+    async def test_generate_streams_progress_under_asgi(self, Scheduler):
+        self.mock_generate(Scheduler)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.post(
+            f"/schedules/{self.schedule.id}/generate",
+            {},
+            content_type="application/json",
+            headers={"accept": "text/event-stream"},
+        )
+
+        self.assertTrue(response.is_async)
+        self.assertGenerateEvents(
+            b"".join([chunk async for chunk in response.streaming_content])
+        )
+        self.assertTrue(
+            await self.schedule.assignments.filter(user=self.user).aexists()
+        )
+
+    def test_user_name_index_follows_renames(self):
+        self.assertEqual(resolve_user_id("One, User"), self.user.pk)
+
+        self.user.last_name = "Two"
+        self.user.save()
+
+        self.assertIsNone(resolve_user_id("One, User"))
+        self.assertEqual(resolve_user_id("Two, User"), self.user.pk)
+
+    def test_update_assignments_query_count_does_not_grow_with_cells(self):
+        def count_queries(assignment_map):
+            with CaptureQueriesContext(connection) as queries:
+                update_assignments_in_schedule(self.schedule, assignment_map)
+            return len(queries)
+
+        query_count = count_queries(
+            {"2023-5-6-task_0": "One, User", "2023-5-13-task_0": None}
+        )
+        for i in range(1, 6):
+            self.add_task(f"task_{i}")
+
+        self.assertEqual(
+            count_queries(
+                {
+                    **{f"2023-5-6-task_{i}": "One, User" for i in range(6)},
+                    **{f"2023-5-13-task_{i}": None for i in range(6)},
+                }
+            ),
+            query_count,
+        )
+        self.assertEqual(self.schedule.assignments.filter(user=self.user).count(), 6)
+
+    def test_service_tables(self):
+        response = self.client.get(f"/schedules/{self.schedule.id}/")
+
+        table = response.context["service_tables"][2]
+        self.assertEqual(table["service"], self.service)
+        self.assertEqual(table["header_days"], [6, 13, 20, 27, 0])
+        cells = table["rows"][0]["cells"]
+        self.assertEqual(
+            [cell["key"] for cell in cells],
+            [
+                "2023-5-6-task_0",
+                "2023-5-13-task_0",
+                "2023-5-20-task_0",
+                "2023-5-27-task_0",
+                None,
+            ],
+        )
+        self.assertEqual(cells[0]["user"], User.objects.get(first_name="task_0"))
+        self.assertFalse(cells[4]["valid"])
+
+    def test_schedule_data(self):
+        other = User.objects.get(first_name="task_0")
+        stat = AssignmentStats.objects.create(
+            user=other, task=Task.objects.get(id="task_0"), assignment_delta=-0.5
+        )
+        stat.schedule.add(self.schedule)
+
+        response = self.client.get(f"/schedules/{self.schedule.id}/data")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+        data = response.json()
+        self.assertEqual(data["assignments"], {"2023-5-6-task_0": other.pk})
+        self.assertEqual(data["users"][str(other.pk)], "User, task_0")
+        self.assertEqual(data["eligible"]["task_0"], [other.pk, self.user.pk])
+        self.assertEqual(data["deltas"]["task_0"], {str(other.pk): -0.5})
+        self.assertEqual(data["services"][2]["tasks"][0]["cells"][0], "2023-5-6-task_0")
+
+    def test_schedule_data_not_modified(self):
+        url = f"/schedules/{self.schedule.id}/data"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        update_assignments_in_schedule(self.schedule, {"2023-5-6-task_0": None})
+        # Only the ETag decides, edits within a second share an updated_at
+        response = self.client.get(
+            url, headers={"if-modified-since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["assignments"], {})
+
+    def test_schedule_data_not_found(self):
+        response = self.client.get("/schedules/0/data")
+        self.assertEqual(response.status_code, 404)
+
+    def test_month_view_not_modified(self):
+        url = f"/schedules/{self.schedule.id}/"
+        response = self.client.get(url)
+        self.assertEqual(
+            response["Cache-Control"], "private, max-age=0, must-revalidate"
+        )
+
+        response = self.client.get(url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_month_view_etag_changes_with_assignments(self):
+        url = f"/schedules/{self.schedule.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        self.add_task("task_1")
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_grid_follows_task_changes(self):
+        url = f"/schedules/{self.schedule.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        task = Task.objects.create(id="task_new", name="New Task", service=self.service)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "New Task")
+
+        task.name = "Renamed Task"
+        task.save()
+        self.assertContains(self.client.get(url), "Renamed Task")
+
+    def test_cached_grid_follows_user_changes(self):
+        url = f"/schedules/{self.schedule.id}/"
+        etag = self.client.get(url)["ETag"]
+        data_etag = self.client.get(f"{url}data")["ETag"]
+
+        user = User.objects.get(email="task_0@example.com")
+        user.last_name = "Renamed"
+        user.save()
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Renamed, task_0")
+        response = self.client.get(f"{url}data", headers={"if-none-match": data_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["users"][str(user.pk)], "Renamed, task_0")
+
+    @override_settings(SCHEDULE_PDF_ROOT=tempfile.mkdtemp())
+    @patch("schedules.services.pdf.pdfkit.from_string", return_value=b"%PDF")
+    def test_pdf_not_modified(self, from_string):
+        url = f"/schedules/{self.schedule.id}/pdf"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(from_string.call_count, 1)
+
+
+@override_settings(SCHEDULE_PDF_ROOT=tempfile.mkdtemp())
+@patch("schedules.services.pdf.pdfkit.from_string", return_value=b"%PDF")
+class SchedulePdfTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user1@example.com", first_name="User", last_name="One"
+        )
+        for day_of_week in (0, 3, None, 6):
+            self.service = Service.objects.create(
+                name=f"Service {day_of_week}",
+                day_of_week=day_of_week,
+                start_time=time(9, 0),
+            )
+        self.task = Task.objects.create(
+            name="task_0", id="task_0", service=self.service
+        )
+        self.schedule = Schedule.objects.create(
+            name="May 2023", date=datetime.date(2023, 5, 1), user=self.user
+        )
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(settings.SCHEDULE_PDF_ROOT, ignore_errors=True)
+
+    def test_stored_pdf_served_until_schedule_changes(self, from_string):
+        url = f"/schedules/{self.schedule.id}/pdf"
+        self.assertEqual(self.client.get(url).content, b"%PDF")
+        self.assertEqual(self.client.get(url).content, b"%PDF")
+        self.assertEqual(from_string.call_count, 1)
+
+        update_assignments_in_schedule(self.schedule, {"2023-5-6-task_0": None})
+        self.client.get(url)
+        self.assertEqual(from_string.call_count, 2)
+
+        # only the current version is kept
+        directory = f"schedule-{self.schedule.id}"
+        self.assertEqual(len(get_pdf_storage().listdir(directory)[1]), 1)
+
+    def test_stored_pdf_renders_do_not_clobber_each_other(self, from_string):
+        directory = f"schedule-{self.schedule.id}"
+        storage = get_pdf_storage()
+        requested_at = time_module.time()
+
+        # Two renders of the same version store one file under its name
+        write_schedule_pdf("", directory, f"{directory}/b.pdf", requested_at)
+        write_schedule_pdf("", directory, f"{directory}/b.pdf", requested_at)
+        self.assertEqual(storage.listdir(directory)[1], ["b.pdf"])
+
+        # A render requested before b was stored, finishing late, keeps b
+        write_schedule_pdf("", directory, f"{directory}/a.pdf", requested_at)
+        self.assertCountEqual(storage.listdir(directory)[1], ["a.pdf", "b.pdf"])
+
+        write_schedule_pdf("", directory, f"{directory}/c.pdf", time_module.time())
+        self.assertEqual(storage.listdir(directory)[1], ["c.pdf"])
+
+    def test_stored_pdf_regenerated_when_tasks_change(self, from_string):
+        url = f"/schedules/{self.schedule.id}/pdf"
+        etag = self.client.get(url)["ETag"]
+
+        self.task.name = "Renamed"
+        self.task.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(from_string.call_count, 2)
+        self.assertIn("Renamed", from_string.call_args.args[0])
+
+        with patch("schedules.services.pdf.PDF_RENDER_VERSION", 0):
+            self.client.get(url)
+        self.assertEqual(from_string.call_count, 3)
+
+    def test_pdf_pregenerated_when_official(self, from_string):
+        self.schedule.select_as_official()
+        get_schedule_pdf(self.schedule)
+        self.assertEqual(from_string.call_count, 1)
+
+        self.client.get(f"/schedules/{self.schedule.id}/pdf")
+        self.assertEqual(from_string.call_count, 1)
+
+    def test_pregeneration_failure_does_not_block_selection(self, from_string):
+        from_string.side_effect = OSError("wkhtmltopdf not found")
+
+        with self.assertLogs("schedules.services.pdf", level="ERROR"):
+            self.schedule.select_as_official()
+            with self.assertRaises(OSError):
+                get_schedule_pdf(self.schedule)
+
+        self.schedule.refresh_from_db()
+        self.assertTrue(self.schedule.is_official)
+
+    @override_settings(SCHEDULE_PDF_WAIT_TIMEOUT=0)
+    def test_concurrent_downloads_share_one_render(self, from_string):
+        release = threading.Event()
+        from_string.side_effect = lambda *args, **kwargs: release.wait() and b"%PDF"
+        url = f"/schedules/{self.schedule.id}/pdf"
+
+        responses = [self.client.get(url) for _ in range(3)]
+
+        self.assertEqual([response.status_code for response in responses], [202] * 3)
+        self.assertEqual(responses[0]["Retry-After"], "2")
+        release.set()
+        self.assertEqual(get_schedule_pdf(self.schedule), b"%PDF")
+        self.assertEqual(from_string.call_count, 1)
+        self.assertEqual(self.client.get(url).status_code, 200)
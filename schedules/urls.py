@@ -8,6 +8,8 @@ urlpatterns = [
     path("", views.MonthListView.as_view(), name="index"),
     path("<int:id>/", views.MonthView.as_view(), name="month_view"),
     path("create/", views.create_schedule, name="create_schedule"),
+    path("performance", views.performance, name="performance"),
+    path("export/<str:dataset>.csv", views.export_history, name="export_history"),
     path(
         "<int:id>/generate",
         views.generate_schedule_assignments,
@@ -16,4 +18,8 @@ urlpatterns = [
     path("<int:id>/clear", views.clear_schedule, name="clear_schedule"),
     path("<int:id>/update", views.update_schedule, name="update_schedule"),
     path("<int:id>/pdf", views.pdf, name="pdf"),
+    path("<int:id>/import", views.import_schedule, name="import_schedule"),
+    path("<int:id>/data", views.schedule_data, name="schedule_data"),
+    path("<int:id>/changes", views.schedule_changes, name="schedule_changes"),
+    path("<int:id>/events", views.schedule_events, name="schedule_events"),
 ]
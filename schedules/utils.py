@@ -1,4 +1,13 @@
 import calendar
+from functools import lru_cache
+
+# Weeks start on Sunday, like the printed schedule. The first weekday is
+# kept by this instance, calendar.setfirstweekday would change it for every
+# thread of the process.
+SCHEDULE_CALENDAR = calendar.Calendar(firstweekday=calendar.SUNDAY)
+
+# Months kept by each cache, a few years of schedules
+CALENDAR_CACHE_SIZE = 128
 
 
 def has_services_this_week(week, service_days):
@@ -42,19 +51,57 @@ def get_month_calendar(year, month):
         month: Integer representing the month (1-12)
 
     Returns:
-        tuple: Calendar data for the month and month name
+        tuple: Calendar data for the month and month name. The weeks are
+        shared between callers and must not be modified.
+    """
+    return _get_month_weeks(year, month), calendar.month_name[month]
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def _get_month_weeks(year, month) -> tuple[tuple[int, ...], ...]:
+    return tuple(
+        tuple(week) for week in SCHEDULE_CALENDAR.monthdayscalendar(year, month)
+    )
+
+
+def get_month_service_weeks(year, month, service_days) -> tuple[tuple[int, ...], ...]:
+    """
+    Weeks of a month that have services scheduled, see get_service_weeks.
+    Computed once per month and set of service days.
     """
-    calendar.setfirstweekday(calendar.SUNDAY)
-    return calendar.monthcalendar(year, month), calendar.month_name[month]
+    return _get_month_service_weeks(year, month, frozenset(service_days))
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def _get_month_service_weeks(year, month, service_days: frozenset):
+    month_calendar, _ = get_month_calendar(year, month)
+    return tuple(get_service_weeks(month_calendar, service_days))
+
+
+def get_service_dates(year, month, service_days, service_day) -> tuple[int, ...]:
+    """
+    Calendar day of a service in each service week of a month, see
+    get_service_day. 0 or None where the service has no day in a week.
+    Computed once per month, set of service days and service day.
+    """
+    return _get_service_dates(year, month, frozenset(service_days), service_day)
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE * 8)
+def _get_service_dates(year, month, service_days: frozenset, service_day):
+    return tuple(
+        get_service_day(week, service_days, service_day)
+        for week in _get_month_service_weeks(year, month, service_days)
+    )
 
 
-def get_service_day(service_week: list[list[int]], service_days, service_day):
+def get_service_day(service_week: list[int], service_days, service_day):
     """
     get the calendar day for a given a service week and a service day.
     if service_day is None, return the first calendar day in service_week that is
     also in service_days.
 
-    Must be same logic as in schedule_tags#get_service_day
+    Also used by schedule_tags#get_service_day
     """
     if service_day is not None:
         return service_week[service_day]
@@ -1,77 +1,147 @@
-from collections import defaultdict
+import asyncio
 import json
-import pdfkit
-from datetime import datetime
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
-from django.utils import timezone
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.functional import SimpleLazyObject
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition, require_GET
 from django.shortcuts import get_object_or_404, render
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
-from config.settings import BASE_DIR
-from schedules.models import Assignment, AssignmentStats, Schedule, Service, Task
-from schedules.services.scheduler import Scheduler
-from schedules.utils import (
-    get_month_calendar,
-    get_service_weeks,
+from schedules.models import AssignmentChange, Schedule, Service
+from schedules.cache import get_eligibility_version, get_services_version
+from schedules.events import broadcaster
+from schedules.metrics import metrics_store
+from schedules.services.assignments import (
+    ScheduleVersionConflict,
+    get_assignment_key,
+    update_assignments_in_schedule,
+)
+from schedules.services.exporter import astream_csv, get_export_rows, stream_csv
+from schedules.services.importer import (
+    IMPORT_FORMATS,
+    import_assignments,
+    parse_assignments,
+)
+from schedules.services.grid import (
+    get_assignment_stats_map,
+    get_eligible_users_data,
+    get_eligible_users_for_task,
+    get_schedule_grid_data,
+    get_service_assignments,
+    get_service_tables,
+    get_stats_schedule_id,
 )
+from schedules.services.pdf import (
+    get_pdf_filename,
+    get_schedule_pdf,
+    get_schedule_pdf_version,
+)
+from schedules.services.scheduler import Scheduler
+from schedules.utils import get_month_calendar, get_month_service_weeks
 from django.views.decorators.csrf import csrf_exempt
-import os
+
+logger = logging.getLogger(__name__)
+
+
+def get_schedule_etag(request, id):
+    """
+    The page and its data also change with the eligibility of users and with
+    the services and tasks, which are shared by all schedules
+    """
+    version = Schedule.objects.get_version(id)
+    if version is None:
+        return None
+    return f"{version}-{get_eligibility_version()}-{get_services_version()}"
+
+
+def get_schedule_pdf_etag(request, id):
+    return get_schedule_pdf_version(id)
+
+
+# Reconnect delay for event stream clients, and how often an idle stream sends
+# a comment so proxies keep it open
+SCHEDULE_EVENTS_RETRY_MS = 3000
+SCHEDULE_EVENTS_KEEPALIVE_SECONDS = 15
+# How often a streamed generate reports that the solver is still running
+GENERATE_HEARTBEAT_SECONDS = 2
+
+# Browsers may keep a private copy but must revalidate it with the ETag, which
+# is answered with a 304 while the schedule is unchanged
+REVALIDATE_CACHE_CONTROL = "private, max-age=0, must-revalidate"
+
+
+def is_asgi_request(request) -> bool:
+    """
+    Django reads a streaming response in the mode of the handler serving it,
+    async iterators under ASGI and sync ones under WSGI, and buffers the
+    other kind whole. Streams pick their iterator with this.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def supports_schedule_events(request) -> bool:
+    """Whether live updates are served, see SCHEDULE_EVENTS_WSGI"""
+    return is_asgi_request(request) or settings.SCHEDULE_EVENTS_WSGI
 
 
 class MonthView(generic.View):
 
+    # No Last-Modified: updated_at has a resolution of a second and misses
+    # changes to eligibility, clients revalidate with the ETag only
+    @method_decorator(condition(etag_func=get_schedule_etag))
     def get(self, request, id):
         schedule = Schedule.objects.get(id=id)
 
         year = schedule.date.year
         month = schedule.date.month
-        month_calendar, month_name = get_month_calendar(year, month)
+        _, month_name = get_month_calendar(year, month)
 
         # TODO consider moving these queries to ScheduleManager
         # Prefetch related objects to minimize queries
 
-        # TODO check if we can prefetch tasks here
-        services = Service.objects.prefetch_related(
-            "tasks__users_with_preferences", "tasks__excludes"
-        ).all()
+        services = Service.objects.prefetch_related("tasks").all()
+        tasks = [task for service in services for task in service.tasks.all()]
 
-        assignments = schedule.assignments.select_related(
-            "task", "user", "task__service"
-        )
-        assignment_stats = AssignmentStats.objects.filter(
-            schedule=schedule if assignments.count() > 0 else schedule.base_schedule
-        ).select_related("task", "user")
+        stats_schedule_id = get_stats_schedule_id(schedule)
 
         service_days = {service.day_of_week for service in services}
-        service_weeks = get_service_weeks(month_calendar, service_days)
-
-        # Collect assignment stats in a dictionary
-        assignment_stats_map = {
-            (stat.task.id, stat.user.pk): stat.assignment_delta
-            for stat in assignment_stats
-        }
-
-        # Create a map of service_name to assignments for tasks in that service
-        service_assignments = defaultdict(dict)
-        for assignment in assignments:
-            assignment_key = (
-                f"{year}-{month}-{assignment.assigned_at.day}-{assignment.task.id}"
+        service_weeks = get_month_service_weeks(year, month, service_days)
+
+        # Evaluated only when a cached fragment needs to be rendered
+        service_tables = SimpleLazyObject(
+            lambda: get_service_tables(
+                year,
+                month,
+                services,
+                service_weeks,
+                service_days,
+                get_service_assignments(schedule),
             )
-            service_assignments[assignment.task.service.name][
-                assignment_key
-            ] = assignment.user
-
-        # create map of eligible users for each task sorted by assignment delta
-        eligible_users_for_task = defaultdict(list)
-        for service in services:
-            for task in service.tasks.all():
-                eligible_users = task.get_eligible_users()
-                sorted_users = sorted(
-                    eligible_users,
-                    key=lambda user: assignment_stats_map.get((task.id, user.pk), 1),
-                )
-                eligible_users_for_task[task.id] = sorted_users
-        eligible_users_for_task.default_factory = None
+        )
+        eligible_users_for_task = SimpleLazyObject(
+            lambda: get_eligible_users_for_task(
+                tasks, get_assignment_stats_map(stats_schedule_id)
+            )
+        )
+
+        # Templates call callables, so this too only runs on a cache miss
+        eligible_users_data = partial(get_eligible_users_data, eligible_users_for_task)
 
         context = {
             "year": year,
@@ -80,11 +150,22 @@ class MonthView(generic.View):
             "month_name": month_name,
             "service_days": service_days,
             "service_weeks": service_weeks,
-            "service_assignments": service_assignments,
+            "service_tables": service_tables,
             "eligible_users_for_task": eligible_users_for_task,
+            "eligible_users_data": eligible_users_data,
             "col_span": len(service_weeks) + len(service_weeks) + 1,
+            "schedule_id": schedule.id,
+            "stats_schedule_id": stats_schedule_id,
+            "schedule_version": schedule.version,
+            "live_updates": supports_schedule_events(request),
+            "content_version": Schedule.objects.get_version(schedule.id),
+            "eligibility_version": get_eligibility_version(),
+            "services_version": get_services_version(),
+            "fragment_cache_timeout": settings.SCHEDULE_FRAGMENT_CACHE_TIMEOUT,
         }
-        return render(request, "schedules/month_schedule.html", context)
+        response = render(request, "schedules/month_schedule.html", context)
+        response["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return response
 
     def post(self, request, year, month):
         """
@@ -114,82 +195,140 @@ def generate_schedule_assignments(request, id):
         # Could also take assignments from schedule itself
         assignment_map = json.loads(request.body) or {}
 
-        scheduler = Scheduler(schedule, services, assignment_map)
+        # Clients that accept events get progress while the solver runs
+        if "text/event-stream" in request.headers.get("Accept", ""):
+            if is_asgi_request(request):
+                events = astream_generate_events(schedule, services, assignment_map)
+            else:
+                events = stream_generate_events(schedule, services, assignment_map)
+            response = StreamingHttpResponse(events, content_type="text/event-stream")
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        try:
+            scheduler = Scheduler(schedule, services, assignment_map)
+        except ValueError as e:
+            return JsonResponse({"success": False, "error": str(e)}, status=400)
         result, assignment_map = scheduler.solve()
-        print(f"schedule result: {result}")
+        logger.info("Generated schedule %s: %s", schedule.id, result)
 
-        update_assignments_in_schedule(schedule, assignment_map)
+        version, _ = update_assignments_in_schedule(
+            schedule, scheduler.assigned_user_ids
+        )
 
-        return JsonResponse({"result": result, "assignment_map": assignment_map})
+        return JsonResponse(
+            {"result": result, "assignment_map": assignment_map, "version": version}
+        )
 
 
-def update_assignments_in_schedule(schedule: Schedule, assignment_map: dict[str, str]):
-    """update assignments in database"""
-    # extract first names and last names from assignment map
-    first_names = []
-    last_names = []
-    assignment_to_delete = []
-
-    # filter out bad inputs:
-    for date_task_str, user_name_inverted in assignment_map.items():
-        if user_name_inverted is None:
-            assignment_to_delete.append(date_task_str)
-        elif "," not in user_name_inverted:
-            # TODO let frontend detect partial user  name input
-            # partial input save, let next save do update
-            del assignment_map[date_task_str]
-        else:
-            first_names.append(user_name_inverted.split(", ")[1])
-            last_names.append(user_name_inverted.split(", ")[0])
-
-    # get users in batch, create map of user inverted name to user
-    # TODO filter by group
-    # TODO there is a better way to do this
-    users = get_user_model().objects.filter(
-        first_name__in=first_names, last_name__in=last_names
+def stream_generate_events(schedule, services, assignment_map):
+    """
+    Server-sent events of a generate: "model" once the problem is built,
+    "solving" every few seconds while CBC runs and "result" with the same data
+    as the JSON response. CBC reports no intermediate solutions through PuLP,
+    so there is nothing to send between the start and the end of the solve.
+    """
+    started = time.monotonic()
+    try:
+        scheduler = Scheduler(schedule, services, assignment_map)
+    except ValueError as e:
+        yield format_event("error", {"error": str(e)})
+        return
+    yield format_event(
+        "model",
+        {
+            "variables": len(scheduler.x),
+            "constraints": len(scheduler.prob.constraints),
+            "elapsed": round(time.monotonic() - started, 1),
+        },
+    )
+
+    # The solve works on data loaded by the scheduler, it doesn't need the
+    # request's database connection. When the client goes away the stream is
+    # closed, don't hold the worker until CBC finishes.
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        solving = executor.submit(scheduler.solve)
+        while True:
+            try:
+                result, assignment_map = solving.result(
+                    timeout=GENERATE_HEARTBEAT_SECONDS
+                )
+                break
+            except TimeoutError:
+                yield format_event(
+                    "solving", {"elapsed": round(time.monotonic() - started, 1)}
+                )
+            except Exception as e:
+                yield format_event("error", {"error": str(e)})
+                return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    version, _ = update_assignments_in_schedule(schedule, scheduler.assigned_user_ids)
+    yield format_event(
+        "result",
+        {"result": result, "assignment_map": assignment_map, "version": version},
+    )
+
+
+async def astream_generate_events(schedule, services, assignment_map):
+    """
+    stream_generate_events for ASGI, which reads streams asynchronously. The
+    solve runs in a thread and the heartbeats are sent while it is awaited.
+    """
+    started = time.monotonic()
+    try:
+        scheduler = await sync_to_async(Scheduler)(schedule, services, assignment_map)
+    except ValueError as e:
+        yield format_event("error", {"error": str(e)})
+        return
+    yield format_event(
+        "model",
+        {
+            "variables": len(scheduler.x),
+            "constraints": len(scheduler.prob.constraints),
+            "elapsed": round(time.monotonic() - started, 1),
+        },
+    )
+
+    # Like in stream_generate_events, the solve doesn't need the database
+    # thread
+    solving = asyncio.ensure_future(
+        sync_to_async(scheduler.solve, thread_sensitive=False)()
     )
-    user_map = {user.inverted_name(): user for user in users}
-
-    # get tasks in batch, create map of task id to task
-    # TODO add schedule to service model
-    # TODO get tasks from schedule's services
-    tasks = Task.objects.all()
-    task_map = {task.id: task for task in tasks}
-
-    for date_task_str in assignment_to_delete:
-        date_and_task_id = date_task_str.rsplit("-", 1)
-        date_str = date_and_task_id[0]
-        task_id = date_and_task_id[1]
-        task = task_map[task_id]
-        print(f"deleting assignment {date_task_str}")
-        Assignment.objects.filter(
-            schedule=schedule,
-            task=task,
-            assigned_at=datetime.strptime(date_str, "%Y-%m-%d").replace(
-                tzinfo=timezone.get_current_timezone()
-            ),
-        ).delete()
-
-    for date_task_str, user_name_inverted in assignment_map.items():
-        if user_name_inverted:
-            date_and_task_id = date_task_str.rsplit("-", 1)
-            task_id = date_and_task_id[1]
-            date_str = date_and_task_id[0]
-            user = user_map[user_name_inverted]
-            task = task_map[task_id]
-            date = datetime.strptime(date_str, "%Y-%m-%d").replace(
-                tzinfo=timezone.get_current_timezone()
+    while True:
+        try:
+            result, assignment_map = await asyncio.wait_for(
+                asyncio.shield(solving), timeout=GENERATE_HEARTBEAT_SECONDS
             )
-            assignment, created = Assignment.objects.update_or_create(
-                schedule=schedule,
-                task=task,
-                assigned_at=date,
-                defaults={"user": user},
+            break
+        except TimeoutError:
+            yield format_event(
+                "solving", {"elapsed": round(time.monotonic() - started, 1)}
             )
-            # if created:
-            #     print(f"created assignment {assignment}")
-            # else:
-            #     print(f"updated assignment {assignment}")
+        except Exception as e:
+            yield format_event("error", {"error": str(e)})
+            return
+
+    version, _ = await sync_to_async(update_assignments_in_schedule)(
+        schedule, scheduler.assigned_user_ids
+    )
+    yield format_event(
+        "result",
+        {"result": result, "assignment_map": assignment_map, "version": version},
+    )
+
+
+@require_GET
+@condition(etag_func=get_schedule_etag)
+def schedule_data(request, id):
+    """Read-only JSON form of a schedule, see get_schedule_grid_data"""
+    schedule = get_object_or_404(Schedule, id=id)
+    response = JsonResponse(get_schedule_grid_data(schedule))
+    response["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return response
 
 
 # TODO add csrf
@@ -197,100 +336,246 @@ def update_assignments_in_schedule(schedule: Schedule, assignment_map: dict[str,
 def update_schedule(request, id):
     """update assignments in database"""
     if request.method == "PUT":
-        assignment_map = json.loads(request.body) or {}
+        try:
+            assignment_map = json.loads(request.body) or {}
+        except ValueError:
+            assignment_map = None
+        if not isinstance(assignment_map, dict):
+            return JsonResponse(
+                {"success": False, "error": "Body must be an assignment map"},
+                status=400,
+            )
         schedule = Schedule.objects.get(id=id)
         print(f"update schedule: {assignment_map}")
         if not schedule:
             print("schedule not found")
             return JsonResponse({"success": False, "error": "Schedule not found"})
 
-        if assignment_map:
-            update_assignments_in_schedule(schedule, assignment_map)
+        # Clients send the version their edits are based on
+        expected_version = request.headers.get("X-Schedule-Version")
+        if expected_version and not expected_version.isdigit():
+            return JsonResponse(
+                {"success": False, "error": "Invalid X-Schedule-Version"}, status=400
+            )
+        try:
+            version, rejected = update_assignments_in_schedule(
+                schedule,
+                assignment_map,
+                int(expected_version) if expected_version else None,
+            )
+        except ScheduleVersionConflict as e:
+            response = JsonResponse(
+                {
+                    "success": False,
+                    "error": "Schedule changed, sync changes and retry",
+                    "version": e.version,
+                },
+                status=409,
+            )
+            response["X-Schedule-Version"] = e.version
+            return response
 
-        return JsonResponse({"success": True}, status=204)
+        if rejected:
+            # Saved except for these cells, the client keeps them unsaved
+            response = JsonResponse({"success": True, "rejected": rejected})
+        else:
+            response = JsonResponse({"success": True}, status=204)
+        response["X-Schedule-Version"] = version
+        return response
     return JsonResponse({"success": False}, status=405)
 
 
-# TODO move views into their own files
-@csrf_exempt
-def pdf(request, id):
-    if request.method == "GET":
-        schedule = Schedule.objects.get(id=id)
-
-        year = schedule.date.year
-        month = schedule.date.month
-        month_calendar, month_name = get_month_calendar(year, month)
-
-        # TODO consider moving these queries to ScheduleManager
-        # Prefetch related objects to minimize queries
-        # TODO ask about how reusable bits of view context are encapsulated in django
-
-        # TODO check if we can prefetch tasks here
-        services = Service.objects.all()
-
-        assignments = schedule.assignments.select_related(
-            "task", "user", "task__service"
+def import_schedule(request, id):
+    """
+    Import a month's assignments from a CSV grid or a JSON assignment map,
+    sent as the body or as an uploaded "file". Valid rows are written in one
+    transaction, the response reports the rows that were rejected. Like a
+    form post, the request needs the CSRF token.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False}, status=405)
+    schedule = get_object_or_404(Schedule, id=id)
+
+    upload = request.FILES.get("file")
+    if upload:
+        format = upload.name.rsplit(".", 1)[-1].lower()
+        content = upload.read()
+    else:
+        format = "csv" if request.content_type == "text/csv" else "json"
+        content = request.body
+    format = request.GET.get("format", format)
+    if format not in IMPORT_FORMATS:
+        return JsonResponse(
+            {"success": False, "error": f"Format must be one of {IMPORT_FORMATS}"},
+            status=400,
         )
 
-        service_days = {service.day_of_week for service in services}
-        service_weeks = get_service_weeks(month_calendar, service_days)
-
-        # Create a map of service_name to assignments for tasks in that service
-        service_assignments = defaultdict(dict)
-        for assignment in assignments:
-            assignment_key = (
-                f"{year}-{month}-{assignment.assigned_at.day}-{assignment.task.id}"
-            )
-            service_assignments[assignment.task.service.name][
-                assignment_key
-            ] = assignment.user
-
-        # Read the CSS file
-        app_static_dir = os.path.join(BASE_DIR, "schedules", "static", "schedules")
-        css_path = os.path.join(app_static_dir, "schedule.css")
+    try:
+        rows = parse_assignments(schedule, content.decode("utf-8-sig"), format)
+    except (UnicodeDecodeError, ValueError) as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    report = import_assignments(schedule, rows)
+    response = JsonResponse({"success": True, **report})
+    response["X-Schedule-Version"] = report["version"]
+    return response
+
+
+@require_GET
+def export_history(request, dataset):
+    """
+    Stream a dataset as CSV, see schedules.services.exporter. Dates in
+    ?start= and ?end= (YYYY-MM-DD) limit the range.
+    """
+    try:
+        start, end = (
+            date.fromisoformat(request.GET[param]) if request.GET.get(param) else None
+            for param in ("start", "end")
+        )
+        rows = get_export_rows(dataset, start, end)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    if is_asgi_request(request):
+        content = astream_csv(rows)
+    else:
+        content = stream_csv(rows)
+    response = StreamingHttpResponse(content, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.csv"'
+    return response
+
+
+@require_GET
+def schedule_changes(request, id):
+    """Changes since the version in ?since=, the latest user id of each cell"""
+    schedule = get_object_or_404(Schedule, id=id)
+    try:
+        since = int(request.GET.get("since", 0))
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid version"}, status=400)
+
+    return JsonResponse(get_changes_since(schedule.id, since))
+
+
+def get_changes_since(schedule_id, since) -> dict:
+    """Latest user id of each cell changed after a version, with user names"""
+    changes = AssignmentChange.objects.since(schedule_id, since)
+    users = {
+        user.pk: user.inverted_name()
+        for user in get_user_model().objects.filter(
+            id__in={user_id for user_id in changes.values() if user_id}
+        )
+    }
+    version = Schedule.objects.values_list("version", flat=True).get(id=schedule_id)
+    return {"version": version, "changes": changes, "users": users}
+
+
+def schedule_events(request, id):
+    """
+    Server-sent events of a schedule's changes, in the form of
+    schedule_changes. Clients resume from Last-Event-ID or ?since=.
+    """
+    if not supports_schedule_events(request):
+        # EventSource clients don't reconnect after a 204
+        return HttpResponse(status=204)
+    if not Schedule.objects.filter(id=id).exists():
+        return JsonResponse({"success": False, "error": "Not found"}, status=404)
+    try:
+        since = int(
+            request.headers.get("Last-Event-ID") or request.GET.get("since") or 0
+        )
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid version"}, status=400)
+
+    if is_asgi_request(request):
+        events = stream_schedule_events(id, since)
+    else:
+        events = stream_schedule_events_sync(id, since)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def stream_schedule_events(schedule_id, since):
+    # Subscribe before catching up, so nothing is missed in between. Clients
+    # skip messages for versions they already have.
+    messages = broadcaster.subscribe(schedule_id)
+    try:
+        yield f"retry: {SCHEDULE_EVENTS_RETRY_MS}\n\n"
+        catch_up = await sync_to_async(get_changes_since)(schedule_id, since)
+        if catch_up["changes"]:
+            yield format_schedule_event(catch_up)
+
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    messages.get(), timeout=SCHEDULE_EVENTS_KEEPALIVE_SECONDS
+                )
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                # Fell behind, the client reconnects and catches up
+                return
+            yield format_schedule_event(message)
+    finally:
+        broadcaster.unsubscribe(schedule_id, messages)
+
+
+def stream_schedule_events_sync(schedule_id, since):
+    """stream_schedule_events for WSGI, holds the worker thread while open"""
+    messages = broadcaster.subscribe_sync(schedule_id)
+    try:
+        yield f"retry: {SCHEDULE_EVENTS_RETRY_MS}\n\n"
+        catch_up = get_changes_since(schedule_id, since)
+        if catch_up["changes"]:
+            yield format_schedule_event(catch_up)
+
+        while True:
+            try:
+                message = messages.get(timeout=SCHEDULE_EVENTS_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield format_schedule_event(message)
+    finally:
+        broadcaster.unsubscribe(schedule_id, messages)
+
+
+def format_schedule_event(message) -> str:
+    return format_event("changes", message, message["version"])
+
+
+def format_event(event: str, data, id=None) -> str:
+    """A server-sent event with JSON data"""
+    lines = f"id: {id}\n" if id is not None else ""
+    return f"{lines}event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        if os.path.exists(css_path):
-            with open(css_path, "r") as f:
-                css_content = f.read()
-        else:
-            # Fallback to empty CSS if file not found
-            css_content = ""
 
-        context = {
-            "year": year,
-            "month": month,
-            "month_name": month_name,
-            "services": services,
-            "service_days": service_days,
-            "service_weeks": service_weeks,
-            "service_assignments": service_assignments,
-            "css_content": css_content,
-            "col_span": len(service_weeks) + len(service_weeks) + 1,
-        }
-        html_content = render(
-            request, "schedules/pdf_month_schedule.html", context
-        ).content.decode("utf-8")
-        options = {
-            "page-size": "Legal",
-            "orientation": "Landscape",
-            "encoding": "UTF-8",
-            "no-outline": None,
-            "quiet": "",
-            "disable-external-links": "",
-            "disable-internal-links": "",
-            "enable-local-file-access": "",
-        }
-        pdf = pdfkit.from_string(html_content, False, options=options)
+# TODO move views into their own files
+@csrf_exempt
+@condition(etag_func=get_schedule_pdf_etag)
+def pdf(request, id):
+    if request.method == "GET":
+        schedule = get_object_or_404(Schedule, id=id)
+        filename = get_pdf_filename(schedule)
+        try:
+            pdf = get_schedule_pdf(schedule, timeout=settings.SCHEDULE_PDF_WAIT_TIMEOUT)
+        except TimeoutError:
+            # Still generating, the client polls until it is stored
+            response = JsonResponse({"pending": True, "filename": filename}, status=202)
+            response["Retry-After"] = "2"
+            return response
 
         # return pdf as attachment, content-dipsosition attachment filename
         response = HttpResponse(pdf, content_type="application/pdf")
-        response["Content-Disposition"] = (
-            f'attachment; filename="schedule-{month}-{year}.pdf"'
-        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         response["Content-Length"] = len(pdf)
-        response["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response["Pragma"] = "no-cache"
-        response["Expires"] = "0"
+        response["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        response["Vary"] = "X-Requested-With"
 
         # Add X-Content-Type-Options to prevent MIME type sniffing
         response["X-Content-Type-Options"] = "nosniff"
@@ -302,7 +587,7 @@ def pdf(request, id):
             return JsonResponse(
                 {
                     "pdf_data": pdf.decode("latin1"),
-                    "filename": f"schedule-{month}-{year}.pdf",
+                    "filename": filename,
                 }
             )
 
@@ -320,9 +605,19 @@ def clear_schedule(request, id):
         # only allow the user who created the schedule to clear it
         if request.user == schedule.user:
             print("clear schedule")
-            # get schedule and delete all assignments
-            schedule.assignments.all().delete()
-            return JsonResponse({"success": True})
+            # get schedule and delete all assignments, logging every cleared
+            # cell so clients see it in the changes
+            with transaction.atomic():
+                version = Schedule.objects.lock_version(schedule.pk)
+                changes = {
+                    get_assignment_key(assigned_at, task_id): None
+                    for assigned_at, task_id in schedule.assignments.values_list(
+                        "assigned_at", "task_id"
+                    )
+                }
+                schedule.assignments.all().delete()
+                version = schedule.record_changes(version, changes)
+            return JsonResponse({"success": True, "version": version})
         else:
             return JsonResponse({"success": False, "error": "Unauthorized"}, status=403)
     return JsonResponse({"success": False}, status=405)
@@ -354,3 +649,18 @@ def create_schedule(request):
 
     # If not POST, redirect to the schedules page
     return HttpResponseRedirect("schedules:index")
+
+
+@staff_member_required
+@require_GET
+def performance(request):
+    """
+    Percentiles of the query count, database time, template render time and
+    latency of each view, from the requests served by this process
+    """
+    return JsonResponse(
+        {
+            "budgets": settings.SCHEDULE_PERFORMANCE_BUDGETS,
+            "views": metrics_store.get_percentiles(),
+        }
+    )